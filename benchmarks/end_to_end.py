@@ -0,0 +1,254 @@
+"""End-to-end latency of `shellsage run --analyze` and `ask`, stage by stage.
+
+Starts the fake LLM server from fake_llm.py and points ShellSage at it, so
+numbers do not depend on a real model. For every failure and query in
+corpus.json it times:
+
+    cold_start   the full CLI in a fresh interpreter (subprocess)
+    context      context probes, referenced files, man page excerpt
+    prompt       prompt building (budgeting included)
+    generation   the model request (time to first token reported too)
+    parse        response formatting / parsing
+    render       building and printing the Rich panels (to a string)
+
+and prints a JSON report. With --baseline, stages whose median got slower
+than the baseline by more than --tolerance fail the run (exit code 1).
+
+Usage:
+    python benchmarks/end_to_end.py [--runs 3] [--latency 0.2] [--tokens-per-second 40]
+                                    [--backend ollama|openai] [--output report.json]
+                                    [--baseline old.json] [--tolerance 0.25]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_llm import FakeLLMServer, load_corpus
+
+STAGES = ['cold_start', 'context', 'prompt', 'generation', 'ttft', 'parse', 'render']
+
+
+def _configure_env(server, backend, home):
+    """Point ShellSage at the fake server; returns the environment used"""
+    env = {
+        'SHELLSAGE_HOME': home,
+        'SHELLSAGE_ENV_FILE': os.path.join(home, '.env'),  # Ignore the user's .env
+        'SHELLSAGE_NO_DAEMON': '1',
+        'SHELLSAGE_NO_CACHE': '1',
+        'SHELLSAGE_STREAM': '0',
+        'SHELLSAGE_HEDGE_BACKEND': '',
+        'SHELLSAGE_FALLBACK': '',
+        'OLLAMA_HOST': server.url,
+    }
+    if backend == 'openai':
+        env.update({
+            'MODE': 'api',
+            'ACTIVE_API_PROVIDER': 'openai',
+            'API_MODEL': 'fake-model',
+            'OPENAI_API_KEY': 'fake',
+            'OPENAI_BASE_URL': f"{server.url}/v1",
+        })
+    else:
+        env.update({'MODE': 'local', 'LOCAL_PROVIDER': 'ollama', 'LOCAL_MODEL': 'fake-model'})
+    os.environ.update(env)
+    return dict(os.environ)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _timed_stream(chunks):
+    """(text, total ms, time to first chunk ms) of a chunk iterator"""
+    start = time.perf_counter()
+    first = None
+    parts = []
+    for chunk in chunks:
+        if first is None:
+            first = (time.perf_counter() - start) * 1000
+        parts.append(chunk)
+    return ''.join(parts), (time.perf_counter() - start) * 1000, first or 0.0
+
+
+def _parse(raw, sections, build):
+    """Parse a complete response the way the streaming consumers do"""
+    from shellsage.response_parser import ResponseParser
+
+    parser = ResponseParser(sections)
+    parser.feed(raw)
+    parser.finish()
+    return build(parser.result())
+
+
+def _cold_start(args, env, cwd):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-m', 'shellsage.cli', *args],
+        cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def _analyze(failure, env, workdir):
+    """Stage timings for one failure"""
+    from rich.console import Console
+    from shellsage.error_interceptor import ErrorInterceptor
+    from shellsage.response_parser import ANALYSIS_SECTIONS
+
+    stderr_file = os.path.join(workdir, 'stderr.log')
+    with open(stderr_file, 'w') as f:
+        f.write(failure['error_output'])
+    timings = {'cold_start': _cold_start(
+        ['run', '--analyze', failure['command'], '--exit-code', str(failure['exit_code']),
+         '--stderr-file', stderr_file, '--no-cache'],
+        env, workdir
+    )}
+
+    interceptor = ErrorInterceptor(use_cache=False)
+    handler = interceptor.llm_handler
+    interceptor.last_command = failure['command']
+    interceptor.command_history.append(failure['command'])
+    result = subprocess.CompletedProcess(failure['command'], failure['exit_code'], '', failure['error_output'])
+
+    def collect():
+        context = interceptor._get_additional_context()
+        context.update({
+            'command': failure['command'],
+            'error_output': interceptor._get_full_error_output(result),
+            'cwd': os.getcwd(),
+            'exit_code': failure['exit_code'],
+            'history': list(interceptor.command_history),
+            'relevant_files': interceptor._get_relevant_files_from_history(),
+            'man_excerpt': interceptor._get_man_page(failure['command'].split()[0])
+        })
+        return context
+
+    error_context, timings['context'] = _timed(collect)
+    prompt, timings['prompt'] = _timed(handler._build_prompt, error_context)
+    raw, timings['generation'], timings['ttft'] = _timed_stream(
+        handler.manager.generate_stream(prompt, max_tokens=1024)
+    )
+    solution, timings['parse'] = _timed(_parse, raw, ANALYSIS_SECTIONS, handler._format_parsed)
+    console = Console(file=io.StringIO(), width=120, force_terminal=True)
+    _, timings['render'] = _timed(lambda: console.print(interceptor._render_analysis(solution, error_context)))
+    return timings
+
+
+def _ask(entry, env, workdir, generator):
+    """Stage timings for one `ask` query"""
+    from rich.console import Console
+    from shellsage.cli import _render_ask_results
+    from shellsage.helpers import distribution_name
+    from shellsage.response_parser import COMMAND_SECTIONS, command_results
+
+    timings = {'cold_start': _cold_start(['ask', entry['query'], '--no-cache'], env, workdir)}
+
+    context, timings['context'] = _timed(lambda: {
+        'os': distribution_name(), 'cwd': os.getcwd(), 'git': os.path.exists('.git'), 'history': []
+    })
+    prompt, timings['prompt'] = _timed(generator._build_prompt, entry['query'], context)
+    raw, timings['generation'], timings['ttft'] = _timed_stream(generator.manager.generate_stream(prompt))
+    results, timings['parse'] = _timed(_parse, raw, COMMAND_SECTIONS, command_results)
+    console = Console(file=io.StringIO(), width=120, force_terminal=True)
+    _, timings['render'] = _timed(lambda: console.print(_render_ask_results(results)))
+    return timings
+
+
+def _summarize(samples):
+    """Median / p95 / mean per stage over a list of timing dicts"""
+    summary = {}
+    for stage in STAGES:
+        values = sorted(s[stage] for s in samples if stage in s)
+        if not values:
+            continue
+        summary[stage] = {
+            'median_ms': round(statistics.median(values), 2),
+            'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+            'mean_ms': round(statistics.fmean(values), 2)
+        }
+    return summary
+
+
+def _regressions(report, baseline, tolerance):
+    """Stages whose median is more than `tolerance` slower than in the baseline"""
+    slower = []
+    for scenario, stages in report['scenarios'].items():
+        for stage, stats in stages['summary'].items():
+            old = baseline.get('scenarios', {}).get(scenario, {}).get('summary', {}).get(stage)
+            if old and old['median_ms'] > 0 and stats['median_ms'] > old['median_ms'] * (1 + tolerance):
+                slower.append({
+                    'scenario': scenario,
+                    'stage': stage,
+                    'baseline_ms': old['median_ms'],
+                    'median_ms': stats['median_ms']
+                })
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='Repetitions of every corpus entry')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake model time to first token (s)')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='Fake model token rate (0: no delay)')
+    parser.add_argument('--backend', choices=['ollama', 'openai'], default='ollama')
+    parser.add_argument('--output', help='Also write the report to this file')
+    parser.add_argument('--baseline', help='Earlier report to compare stage medians against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs the baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    server = FakeLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second, corpus=corpus).start()
+    with tempfile.TemporaryDirectory(prefix='shellsage-bench-') as home:
+        env = _configure_env(server, args.backend, home)
+        workdir = os.path.join(home, 'work')
+        os.makedirs(workdir)
+
+        from shellsage.command_generator import CommandGenerator
+
+        generator = CommandGenerator()
+        scenarios = {'analyze': [], 'ask': []}
+        for _ in range(args.runs):
+            for failure in corpus['failures']:
+                scenarios['analyze'].append(_analyze(failure, env, workdir))
+            for entry in corpus['queries']:
+                scenarios['ask'].append(_ask(entry, env, workdir, generator))
+
+    server.shutdown()
+    report = {
+        'python': platform.python_version(),
+        'backend': args.backend,
+        'runs': args.runs,
+        'fake_llm': {'latency_s': args.latency, 'tokens_per_second': args.tokens_per_second,
+                     'requests': server.requests},
+        'scenarios': {
+            name: {'samples': len(samples), 'summary': _summarize(samples)}
+            for name, samples in scenarios.items()
+        }
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = _regressions(report, json.load(f), args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
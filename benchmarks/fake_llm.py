@@ -0,0 +1,222 @@
+"""Fake Ollama / OpenAI-compatible HTTP server with canned responses.
+
+Serves the endpoints ShellSage calls (`/api/generate`, `/api/tags`,
+`/api/show`, `/v1/chat/completions`). Responses are looked up in the benchmark corpus
+by the failed command or query found in the prompt. Time to first token
+and token rate are configurable, so generation costs what a real model
+would without needing one.
+
+Usage:
+    python benchmarks/fake_llm.py [--port 11435] [--latency 0.2] [--tokens-per-second 40]
+    OLLAMA_HOST=http://127.0.0.1:11435 shellsage run --analyze ...
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.json')
+
+DEFAULT_ANALYSIS = """<think>
+The command failed; the error output names the cause.
+</think>
+
+Root Cause: The command failed because of the reported error
+Fix: `true`
+Technical Explanation: The process exited with a non-zero status
+Potential Risks: None
+Prevention Tip: Check the command before running it"""
+
+DEFAULT_ASK = """🧠 Analysis: Run the requested operation
+🛠️ Command: ```true```
+📝 Details: Placeholder answer from the fake server
+⚠️ Warning: None"""
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def tokenize(text):
+    """Split text into word-sized tokens that concatenate back to it"""
+    return re.findall(r'\s*\S+|\s+$', text)
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.2, tokens_per_second=40.0, corpus=None):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.corpus = corpus if corpus is not None else load_corpus()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread; returns self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def response_for(self, prompt):
+        """Canned answer for the corpus entry the prompt is about"""
+        with self._lock:
+            self.requests += 1
+        for entry in self.corpus.get('failures', []):
+            if f"`{entry['command']}`" in prompt:
+                return entry['response']
+        for entry in self.corpus.get('queries', []):
+            if f"USER QUERY: {entry['query']}\n" in prompt:
+                return entry['response']
+        return DEFAULT_ASK if 'USER QUERY:' in prompt else DEFAULT_ANALYSIS
+
+    def tokens(self, prompt):
+        """Yield the answer token by token at the configured rate"""
+        time.sleep(self.latency)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in tokenize(self.response_for(prompt)):
+            time.sleep(delay)
+            yield token
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real servers
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{
+                'name': 'fake-model:latest',
+                'size': 4_661_224_676,
+                'details': {'family': 'llama', 'parameter_size': '8.0B', 'quantization_level': 'Q4_1'}
+            }]})
+        elif self.path == '/v1/models':
+            self._send_json({'object': 'list', 'data': [{'id': 'fake-model', 'object': 'model'}]})
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        try:
+            body = self._body()
+        except json.JSONDecodeError:
+            self._send_json({'error': 'invalid JSON'}, status=400)
+            return
+        if self.path == '/api/generate':
+            self._ollama_generate(body)
+        elif self.path == '/api/show':
+            self._send_json({
+                'parameters': 'num_ctx 4096\nstop "<|eot_id|>"',
+                'model_info': {'general.architecture': 'llama', 'llama.context_length': 8192},
+                'capabilities': ['completion']
+            })
+        elif self.path.endswith('/chat/completions'):
+            self._openai_chat(body)
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def _ollama_generate(self, body):
+        prompt = body.get('prompt', '')
+        start = time.perf_counter_ns()
+        if not prompt:
+            # Preload request: nothing to generate
+            self._send_json({'model': body.get('model'), 'response': '', 'done': True, 'load_duration': 0})
+            return
+        if not body.get('stream', True):
+            response = ''.join(self.server.tokens(prompt))
+            self._send_json({
+                'model': body.get('model'),
+                'response': response,
+                'done': True,
+                'total_duration': time.perf_counter_ns() - start,
+                'load_duration': 0
+            })
+            return
+        self._start_chunked('application/x-ndjson')
+        for token in self.server.tokens(prompt):
+            self._write_chunk(json.dumps({'model': body.get('model'), 'response': token, 'done': False}).encode() + b'\n')
+        done = {'model': body.get('model'), 'response': '', 'done': True,
+                'total_duration': time.perf_counter_ns() - start, 'load_duration': 0}
+        self._write_chunk(json.dumps(done).encode() + b'\n')
+        self._write_chunk(b'')
+
+    def _openai_chat(self, body):
+        prompt = '\n'.join(m.get('content', '') for m in body.get('messages', []))
+        model = body.get('model', 'fake-model')
+        created = int(time.time())
+        if not body.get('stream'):
+            response = ''.join(self.server.tokens(prompt))
+            self._send_json({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': response},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(tokenize(prompt)), 'completion_tokens': len(tokenize(response)),
+                          'total_tokens': len(tokenize(prompt)) + len(tokenize(response))}
+            })
+            return
+        self._start_chunked('text/event-stream')
+        for token in self.server.tokens(prompt):
+            chunk = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+        self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self._write_chunk(b'')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='0 for no delay')
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), args.latency, args.tokens_per_second)
+    print(f"Fake LLM server on {server.url} (latency {args.latency}s, {args.tokens_per_second} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Cold-start vs warm latency of the local Ollama model.
+
+Unloads LOCAL_MODEL, times the first generation (which pays the model load),
+then times repeated generations against the resident model. The difference
+is what `shellsage warm` (or SHELLSAGE_WARM_ON_START=1) saves on the first
+analysis after the model was evicted.
+
+Usage:
+    MODE=local LOCAL_MODEL=llama3:8b-instruct-q4_1 python benchmarks/model_warmup.py [--runs 3]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from shellsage.model_manager import ModelManager
+
+PROMPT = "Reply with the single word OK."
+
+
+def _timed_generate(manager):
+    start = time.perf_counter()
+    manager.generate(PROMPT, max_tokens=8)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='Warm generations to time')
+    args = parser.parse_args()
+
+    manager = ModelManager()
+    if manager.mode != 'local':
+        print("MODE must be 'local' to benchmark Ollama model loading", file=sys.stderr)
+        return 2
+
+    manager.unload()
+    cold = _timed_generate(manager)
+    warm = [_timed_generate(manager) for _ in range(args.runs)]
+
+    # Preloading after an unload reports Ollama's own load_duration
+    manager.unload()
+    preload = manager.preload()
+
+    report = {
+        'model': manager.local_model,
+        'keep_alive': manager.keep_alive,
+        'cold_first_ms': round(cold * 1000, 1),
+        'warm_median_ms': round(statistics.median(warm) * 1000, 1),
+        'preload_ms': round(preload['seconds'] * 1000, 1),
+        'ollama_load_ms': round(preload['load_seconds'] * 1000, 1),
+        'http': manager.transport.stats()
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
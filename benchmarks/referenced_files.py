@@ -0,0 +1,109 @@
+"""Referenced-file extraction on a multi-megabyte build log.
+
+Compares shellsage.file_context.referenced_files with the extraction that
+DeepSeekLLMHandler._build_prompt used to do (`legacy_referenced_files`:
+findall over the whole output, os.path.exists + isfile per match). A
+synthetic compiler log mentioning a few real files and many missing ones
+is generated in a temporary directory; time and stat calls are reported.
+
+Usage:
+    python benchmarks/referenced_files.py [--size-mb 4] [--runs 3]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from shellsage.file_context import referenced_files
+
+
+def legacy_referenced_files(error_output):
+    error_files = []
+    file_matches = re.findall(r'\'(.*?)\'|\"(.*?)\"|\b([\/\w\.-]+\.\w+)\b', error_output)
+    for match in file_matches:
+        for group in match:
+            if group and os.path.exists(group) and os.path.isfile(group):
+                error_files.append(group)
+    return list(dict.fromkeys(error_files))
+
+
+def build_log(directory, size_mb):
+    """Compiler-style log of about size_mb MB; src/real_*.c exist, the rest do not"""
+    os.makedirs(os.path.join(directory, 'src'))
+    for i in range(5):
+        with open(os.path.join(directory, 'src', f"real_{i}.c"), 'w') as f:
+            f.write('int main(void) { return 0; }\n')
+    lines = []
+    size = 0
+    i = 0
+    while size < size_mb * 1024 * 1024:
+        line = (f"gcc -c -O2 -Iinclude src/module_{i % 3000}.c -o build/module_{i % 3000}.o "
+                f"# compiling 'src/module_{i % 3000}.c' with config.h")
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    lines.extend([
+        "src/real_0.c:12:5: warning: unused variable 'x'",
+        "In file included from src/real_1.c:3:",
+        "src/real_2.c:40:1: error: expected ';' before '}' token",
+        "make: *** [Makefile:12: build/real_2.o] Error 1",
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+class StatCounter:
+    """Count os.stat calls (os.path.exists and isfile go through it)"""
+
+    def __enter__(self):
+        self.calls = 0
+        self._stat = os.stat
+
+        def counting_stat(*args, **kwargs):
+            self.calls += 1
+            return self._stat(*args, **kwargs)
+
+        os.stat = counting_stat
+        return self
+
+    def __exit__(self, *exc):
+        os.stat = self._stat
+
+
+def _measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        with StatCounter() as counter:
+            start = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 2), 'stat_calls': counter.calls, 'files': result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=4.0)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='shellsage-bench-') as directory:
+        log = build_log(directory, args.size_mb)
+        os.chdir(directory)  # The legacy code resolves paths against the CWD
+        try:
+            report = {
+                'log_bytes': len(log),
+                'legacy': _measure(lambda: legacy_referenced_files(log), args.runs),
+                'bounded': _measure(lambda: referenced_files(log, directory), args.runs),
+            }
+        finally:
+            os.chdir(previous)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
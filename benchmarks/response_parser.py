@@ -0,0 +1,146 @@
+"""Micro-benchmark of response parsing on large reasoning-model outputs.
+
+Compares shellsage.response_parser with the string-scanning parsers it
+replaced (kept below as `legacy_*`): formatting a complete error analysis,
+parsing a complete `ask` answer, and following a streamed answer, where the
+old code re-parsed the whole text after every completed line.
+
+Usage:
+    python benchmarks/response_parser.py [--thought-lines 2000] [--runs 5] [--chunk 16]
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+
+from shellsage.response_parser import (
+    ANALYSIS_SECTIONS, COMMAND_SECTIONS, ResponseParser, command_results, format_analysis, parse
+)
+
+
+def legacy_format_analysis(raw):
+    """Old DeepSeekLLMHandler._format_response (reasoning models: thoughts dropped)"""
+    thoughts = []
+    remaining = raw
+    while '<think>' in remaining and '</think>' in remaining:
+        think_start = remaining.find('<think>') + len('<think>')
+        think_end = remaining.find('</think>')
+        thoughts.append(remaining[think_start:think_end].strip())
+        remaining = remaining[think_end + len('</think>'):]
+    cleaned = re.sub(r'\n+', '\n', remaining.strip())
+    cleaned = re.sub(r'(\d\.\s|\*\*)', '', cleaned)
+    markers = {'Root Cause': '🔍', 'Fix': '🛠️', 'Technical Explanation': '📚',
+               'Potential Risks': '⚠️', 'Prevention Tip': '🔒'}
+    return re.sub(
+        r'(Root Cause|Fix|Technical Explanation|Potential Risks|Prevention Tip):?',
+        lambda m: f"{markers[m.group(1)]} {m.group(1)}:", cleaned
+    )
+
+
+def legacy_parse_commands(response):
+    """Old CommandGenerator._results_from_response / _parse_response"""
+    remaining = response
+    thoughts = []
+    while '<think>' in remaining and '</think>' in remaining:
+        think_start = remaining.find('<think>') + len('<think>')
+        think_end = remaining.find('</think>')
+        thoughts.append(remaining[think_start:think_end].strip())
+        remaining = remaining[think_end + len('</think>'):]
+    cleaned = re.sub(r'<[^>]+>', '', remaining)
+    markers = {'analysis': ['🧠', 'Analysis:'], 'command': ['🛠️', 'Command:'],
+               'details': ['📝', 'Details:'], 'warning': ['⚠️', 'Warning:']}
+    components = dict.fromkeys(markers)
+    current = None
+    for line in cleaned.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        for section, section_markers in markers.items():
+            if any(marker in line for marker in section_markers):
+                current = section
+                for marker in section_markers:
+                    line = line.replace(marker, '').strip()
+                components[section] = line
+                break
+        if current and not any(m in line for ms in markers.values() for m in ms):
+            components[current] = f"{components[current]}\n{line}" if components[current] else line
+    return [{'type': 'thinking', 'content': t} for t in thoughts] + [
+        {'type': key, 'content': '\n'.join(dict.fromkeys(value.split('\n'))) if value else None}
+        for key, value in components.items()
+    ]
+
+
+def legacy_stream(chunks):
+    """Old streaming path: re-parse everything received after each new line"""
+    received = []
+    for chunk in chunks:
+        received.append(chunk)
+        if '\n' in chunk:
+            text = ''.join(received)
+            legacy_format_analysis(text[:text.rfind('\n') + 1])
+    return legacy_format_analysis(''.join(received))
+
+
+def incremental_stream(chunks):
+    parser = ResponseParser(ANALYSIS_SECTIONS)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if '\n' in chunk:
+            format_analysis(parser.result(), thoughts=False)
+    parser.finish()
+    return format_analysis(parser.result(), thoughts=False)
+
+
+def reasoning_output(thought_lines, sections):
+    """A long <think> block (with the repeated lines such models produce) and an answer"""
+    thought = '\n'.join(
+        f"Step {i}: the error mentions file_{i % 50}.txt, so check whether it exists" for i in range(thought_lines)
+    )
+    answer = '\n'.join(f"{label}: {label.lower()} text for the benchmark" for _, label, _ in sections)
+    return f"<think>\n{thought}\n</think>\n\n{answer}\n"
+
+
+def _median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--thought-lines', type=int, default=2000, help='Lines of reasoning before the answer')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--chunk', type=int, default=16, help='Characters per streamed chunk')
+    args = parser.parse_args()
+
+    analysis = reasoning_output(args.thought_lines, ANALYSIS_SECTIONS)
+    answer = reasoning_output(args.thought_lines, COMMAND_SECTIONS)
+    chunks = [analysis[i:i + args.chunk] for i in range(0, len(analysis), args.chunk)]
+
+    cases = {
+        'analysis': (lambda: legacy_format_analysis(analysis),
+                     lambda: format_analysis(parse(analysis, ANALYSIS_SECTIONS), thoughts=False)),
+        'ask': (lambda: legacy_parse_commands(answer),
+                lambda: command_results(parse(answer, COMMAND_SECTIONS))),
+        'stream': (lambda: legacy_stream(chunks), lambda: incremental_stream(chunks)),
+    }
+    report = {'chars': len(analysis), 'chunks': len(chunks), 'cases': {}}
+    for name, (legacy, current) in cases.items():
+        legacy_ms = _median_ms(legacy, args.runs)
+        current_ms = _median_ms(current, args.runs)
+        report['cases'][name] = {
+            'legacy_ms': legacy_ms,
+            'parser_ms': current_ms,
+            'speedup': round(legacy_ms / current_ms, 1) if current_ms else None
+        }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Cold-start import budget for the shell hook path.
+
+`shellsage run --analyze` is executed by the prompt hook after every failed
+command, so its import cost is paid constantly. This script measures it with
+`python -X importtime` in fresh interpreters and exits non-zero when the
+cumulative import time exceeds the budget or a heavy dependency sneaks back
+into the hot path.
+
+Usage:
+    python benchmarks/startup_budget.py [--budget-ms 150] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules whose import must be triggered only by the commands that need them
+HEAVY_MODULES = ['openai', 'anthropic', 'rich', 'inquirer', 'requests', 'yaml', 'ctransformers']
+
+# (label, code run in a fresh interpreter)
+SCENARIOS = [
+    ('cli', 'import shellsage.cli'),
+    ('run-analyze', 'import shellsage.cli, shellsage.error_interceptor'),
+]
+
+
+def _importtime(code):
+    """Run code under -X importtime and return (shellsage import ms, loaded heavy modules)"""
+    probe = (
+        f"{code}\n"
+        "import sys, json\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    env = dict(os.environ, MODE='local')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True
+    )
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        # Only top-level imports (one leading space) are summed: nested ones
+        # are already included in their parent's cumulative time
+        if name.startswith('  ') or not name.strip().startswith('shellsage'):
+            continue
+        try:
+            total_us += int(cumulative.strip())
+        except ValueError:
+            continue  # Header line
+    return total_us / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('SHELLSAGE_STARTUP_BUDGET_MS', 150)))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # Warm the bytecode cache so the budget measures imports, not compilation
+    _importtime(SCENARIOS[-1][1])
+
+    report = {'budget_ms': args.budget_ms, 'scenarios': {}}
+    failed = False
+    for label, code in SCENARIOS:
+        best_ms = None
+        heavy = []
+        for _ in range(args.runs):
+            ms, heavy = _importtime(code)
+            best_ms = ms if best_ms is None else min(best_ms, ms)
+        ok = best_ms <= args.budget_ms and not heavy
+        failed = failed or not ok
+        report['scenarios'][label] = {
+            'import_ms': round(best_ms, 2),
+            'heavy_modules': heavy,
+            'ok': ok
+        }
+
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
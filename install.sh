@@ -53,10 +53,10 @@ shellsage setup
 
 # Install shell hook
 echo -e "${YELLOW}⚙️ Installing shell hook...${NC}"
-HOOK=$'shell_sage_prompt() {\n    local EXIT=$?\n    local CMD=$(fc -ln -1 | awk \'{$1=$1}1\' | sed \'s/\\\\/\\\\\\\\/g\')\n    [ $EXIT -ne 0 ] && shellsage run --analyze "$CMD" --exit-code $EXIT\n    history -s "$CMD"  # Force into session history\n}\nPROMPT_COMMAND="shell_sage_prompt"'
+HOOK="$(shellsage install --raw)"
 
 if [ -f ~/.bashrc ]; then
-    echo -e "\n# Shell Sage Hook\n$HOOK" >> ~/.bashrc
+    printf '\n# Shell Sage Hook\n%s\n' "$HOOK" >> ~/.bashrc
     echo -e "${GREEN}✅ Added to ~/.bashrc${NC}"
     # Refresh bash if we're in bash
     if [ -n "$BASH" ]; then
@@ -64,13 +64,9 @@ if [ -f ~/.bashrc ]; then
     fi
 fi
 
-if [ -f ~/.zshrc ]; then
-    echo -e "\n# Shell Sage Hook\n$HOOK" >> ~/.zshrc
-    echo -e "${GREEN}✅ Added to ~/.zshrc${NC}"
-    # Refresh zsh if we're in zsh
-    if [ -n "$ZSH_VERSION" ]; then
-        source ~/.zshrc
-    fi
+if [ -f ~/.zshrc ] && [ ! -f ~/.bashrc ]; then
+    # The hook needs bash (DEBUG trap and PROMPT_COMMAND)
+    echo -e "${YELLOW}⚠️ The shell hook only supports bash; use 'shellsage run' and 'shellsage ask' from zsh${NC}"
 fi
 
 echo -e "\n${GREEN}✅ Installation Complete!${NC}"
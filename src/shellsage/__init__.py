@@ -1,4 +1,11 @@
 from .cli import cli
-from .error_interceptor import ErrorInterceptor
 
-__all__ = ['cli', 'ErrorInterceptor']
\ No newline at end of file
+__all__ = ['cli', 'ErrorInterceptor']
+
+
+def __getattr__(name):
+    # Imported on demand so `shellsage.cli` (the console entry point) stays light
+    if name == 'ErrorInterceptor':
+        from .error_interceptor import ErrorInterceptor
+        return ErrorInterceptor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
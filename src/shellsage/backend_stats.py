@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+import time
+from .helpers import get_state_dir
+
+# Generation latency and health per backend, persisted so short-lived
+# `shellsage run` processes can learn from earlier ones. Hedged requests
+# derive their delay from the latency percentiles; the fallback chain skips
+# backends whose circuit breaker is open.
+#
+# Breaker states: 'closed' (normal), 'open' (skipped until the cooldown
+# passes), 'half_open' (one caller is probing; success closes the breaker,
+# failure re-opens it).
+
+SAMPLES_PER_BACKEND = 200
+BREAKER_FAILURES = 3    # SHELLSAGE_BREAKER_FAILURES: consecutive failures that open a breaker
+BREAKER_COOLDOWN = 60   # SHELLSAGE_BREAKER_COOLDOWN: seconds before an open breaker is probed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backend TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_backend ON samples (backend, id);
+CREATE TABLE IF NOT EXISTS breakers (
+    backend TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    changed REAL NOT NULL
+);
+"""
+
+
+def backend_key(identity):
+    """'mode/provider/model' for a ModelManager.backend_identity() tuple"""
+    return '/'.join(str(part) for part in identity)
+
+
+class BackendStats:
+    def __init__(self, path=None):
+        self.path = path or get_state_dir() / 'backend_stats.db'
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), timeout=2, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.max_failures = int(os.getenv('SHELLSAGE_BREAKER_FAILURES', BREAKER_FAILURES))
+        self.cooldown = float(os.getenv('SHELLSAGE_BREAKER_COOLDOWN', BREAKER_COOLDOWN))
+
+    def record(self, backend, seconds, ok=True):
+        """Add a generation sample (keeping the latest SAMPLES_PER_BACKEND) and update the breaker"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO samples (backend, seconds, ok, created) VALUES (?, ?, ?, ?)',
+                (backend, seconds, int(ok), now)
+            )
+            self.conn.execute(
+                'DELETE FROM samples WHERE backend = ? AND id <= '
+                '(SELECT id FROM samples WHERE backend = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                (backend, backend, SAMPLES_PER_BACKEND)
+            )
+            if ok:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO breakers (backend, state, failures, changed) VALUES (?, 'closed', 0, ?)",
+                    (backend, now)
+                )
+                return
+            row = self.conn.execute('SELECT state, failures FROM breakers WHERE backend = ?', (backend,)).fetchone()
+            state, failures = row if row else ('closed', 0)
+            failures += 1
+            if state == 'half_open' or failures >= self.max_failures:
+                state = 'open'
+            self.conn.execute(
+                'INSERT OR REPLACE INTO breakers (backend, state, failures, changed) VALUES (?, ?, ?, ?)',
+                (backend, state, failures, now)
+            )
+
+    def allow(self, backend):
+        """Whether a request may go to backend now; claims the probe of an expired open breaker"""
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT state, changed FROM breakers WHERE backend = ?', (backend,)).fetchone()
+            if row is None or row[0] == 'closed':
+                return True
+            state, changed = row
+            if now - changed < self.cooldown:
+                return False
+            # Cooldown over: let this caller probe, others wait another cooldown
+            self.conn.execute(
+                "UPDATE breakers SET state = 'half_open', changed = ? WHERE backend = ?", (now, backend)
+            )
+            return True
+
+    def retry_in(self, backend):
+        """Seconds until an open breaker admits a probe (0 when closed)"""
+        with self._lock:
+            row = self.conn.execute('SELECT state, changed FROM breakers WHERE backend = ?', (backend,)).fetchone()
+        if row is None or row[0] == 'closed':
+            return 0
+        return max(0, self.cooldown - (time.time() - row[1]))
+
+    def percentile(self, backend, q, min_samples=5):
+        """q-th percentile (0-100) of successful latencies, None without enough samples"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT seconds FROM samples WHERE backend = ? AND ok = 1 ORDER BY seconds', (backend,)
+            ).fetchall()
+        if len(rows) < min_samples:
+            return None
+        return rows[min(len(rows) - 1, int(len(rows) * q / 100))][0]
+
+    def summary(self):
+        """{backend: {count, errors, state, p50, p95}} over the retained samples"""
+        with self._lock:
+            rows = self.conn.execute('SELECT backend, seconds, ok FROM samples ORDER BY seconds').fetchall()
+            states = dict(self.conn.execute('SELECT backend, state FROM breakers').fetchall())
+        grouped = {}
+        for backend, seconds, ok in rows:
+            entry = grouped.setdefault(backend, {'latencies': [], 'errors': 0})
+            if ok:
+                entry['latencies'].append(seconds)
+            else:
+                entry['errors'] += 1
+        summary = {}
+        for backend, entry in grouped.items():
+            latencies = entry['latencies']
+            summary[backend] = {
+                'count': len(latencies),
+                'errors': entry['errors'],
+                'state': states.get(backend, 'closed'),
+                'p50': latencies[len(latencies) // 2] if latencies else None,
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+            }
+        return summary
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,244 @@
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .fingerprint import error_template, fingerprint
+from .response_parser import strip_code
+
+# Batch analysis of failures collected outside an interactive shell (CI logs,
+# cron mail). Failures are deduplicated by error fingerprint, so a log with
+# the same error a hundred times costs one analysis, and the unique ones are
+# analyzed concurrently under a per-provider request rate. Batches of `ask`
+# queries (runbook generation) share the same rate limiting.
+
+# Requests per minute when no --rate is given (free-tier limits of the
+# hosted providers; local backends are only bounded by concurrency)
+DEFAULT_RATE_LIMITS = {
+    'groq': 30,
+    'openrouter': 20,
+    'openai': 500,
+    'anthropic': 50,
+    'fireworks': 600,
+    'deepseek': 60,
+}
+
+# "$ make" / "+ make" (set -x) / "> make" start a command block
+_COMMAND_LINE = re.compile(r'^(?:\$|\+|>)\s+(.+)$')
+_EXIT_LINE = re.compile(
+    r'(?:exit(?:ed)?(?: with)? (?:code|status)|returned non-zero exit status)\s*:?\s*(-?\d+)',
+    re.I
+)
+
+
+def _text_failures(lines):
+    """Command blocks of a plain-text log; see parse_failures"""
+    blocks = []
+    current = None
+    for line in lines:
+        line = line.rstrip('\n')
+        match = _COMMAND_LINE.match(line)
+        if match:
+            current = {'command': match.group(1).strip(), 'exit_code': None, 'output': []}
+            blocks.append(current)
+            continue
+        if current is None:
+            current = {'command': '', 'exit_code': None, 'output': []}
+            blocks.append(current)
+        exit_match = _EXIT_LINE.search(line)
+        if exit_match:
+            current['exit_code'] = int(exit_match.group(1))
+        current['output'].append(line)
+
+    # Logs that never report exit codes (cron mail) are all failures
+    explicit = any(block['exit_code'] is not None for block in blocks)
+    for block in blocks:
+        output = '\n'.join(block['output']).strip()
+        exit_code = block['exit_code'] if explicit else 1
+        if exit_code and output:
+            yield {'command': block['command'], 'exit_code': exit_code, 'error_output': output}
+
+
+def parse_failures(stream, fmt='auto'):
+    """Failures from a JSONL or plain-text log
+
+    JSONL lines are objects with `command`, `exit_code` and `error_output`
+    (`stderr` and `output` are accepted too). Text logs are split into blocks
+    at lines echoing a command ("$ cmd", "+ cmd"); a block is a failure when
+    it reports a non-zero exit code ("exit code 2", "exit status 1", ...).
+    """
+    lines = iter(stream)
+    if fmt == 'auto':
+        first = next(lines, '')
+        fmt = 'jsonl' if first.lstrip().startswith('{') else 'text'
+        lines = itertools.chain([first], lines)
+    if fmt == 'text':
+        yield from _text_failures(lines)
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e.msg})")
+        if not isinstance(entry, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        exit_code = entry.get('exit_code', 1)
+        if isinstance(exit_code, str) and exit_code.strip().lstrip('-').isdigit():
+            exit_code = int(exit_code)
+        if not isinstance(exit_code, int) or isinstance(exit_code, bool):
+            raise ValueError(f"line {number}: exit_code must be an integer, got {json.dumps(exit_code)}")
+        if exit_code == 0:
+            continue
+        command = entry.get('command', '')
+        if not isinstance(command, str):
+            raise ValueError(f"line {number}: command must be a string, got {json.dumps(command)}")
+        error_output = entry.get('error_output') or entry.get('stderr') or entry.get('output') or ''
+        if not isinstance(error_output, str):
+            raise ValueError(f"line {number}: error_output must be a string, got {json.dumps(error_output)}")
+        yield {
+            'command': command,
+            'exit_code': exit_code,
+            'error_output': error_output
+        }
+
+
+def dedupe(failures):
+    """Unique failures by fingerprint, in first-seen order, with occurrence counts"""
+    unique = {}
+    for failure in failures:
+        key = fingerprint(failure['command'], failure['error_output'])
+        if key in unique:
+            unique[key]['occurrences'] += 1
+        else:
+            unique[key] = dict(failure, fingerprint=key, occurrences=1)
+    return list(unique.values())
+
+
+def parse_queries(stream):
+    """`ask` queries from a stream: one per line, or JSONL objects with `query`
+
+    Blank lines and lines starting with "#" are skipped.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                line = json.loads(line)['query']
+            except (json.JSONDecodeError, KeyError, TypeError):
+                raise ValueError(f"line {number}: expected a JSON object with a \"query\"")
+        yield line
+
+
+def ask_record(query, results):
+    """JSONL record for one `ask` query from CommandGenerator results"""
+    record = {'query': query, 'analysis': None, 'command': None, 'details': None, 'warning': None}
+    thinking = [item['content'] for item in results if item['type'] == 'thinking']
+    for item in results:
+        if item['type'] in ('analysis', 'command', 'details', 'warning') and record[item['type']] is None:
+            record[item['type']] = item['content']
+    if record['command']:
+        record['command'] = strip_code(record['command'])
+    record['thinking'] = thinking or None
+    record['ok'] = bool(record['command'])
+    return record
+
+
+class RateLimiter:
+    """Token bucket per key (provider), shared by all worker threads"""
+
+    def __init__(self, per_minute=None, burst=1):
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _rate(self, key):
+        return self.per_minute or DEFAULT_RATE_LIMITS.get(key)
+
+    def acquire(self, key):
+        """Block until a request to `key` is allowed"""
+        rate = self._rate(key)
+        if not rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * rate / 60)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    return
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) * 60 / rate
+            time.sleep(wait)
+
+
+class BatchAnalyzer:
+    def __init__(self, concurrency=4, rate=None, use_cache=True):
+        from .llm_handler import DeepSeekLLMHandler
+
+        self.concurrency = max(1, concurrency)
+        self.use_cache = use_cache
+        self.llm_handler = DeepSeekLLMHandler()
+        self.llm_handler.manager.rate_limiter = RateLimiter(rate, burst=self.concurrency)
+
+    def _knowledge_base(self):
+        import sqlite3
+        from .knowledge_base import KnowledgeBase
+
+        try:
+            return KnowledgeBase()
+        except (sqlite3.Error, OSError):
+            return None
+
+    def analyze(self, failure):
+        """Result record for one unique failure"""
+        start = time.perf_counter()
+        error_context = {
+            'command': failure['command'],
+            'error_output': failure['error_output'],
+            'exit_code': failure['exit_code'],
+            'cwd': os.getcwd(),
+            'history': []
+        }
+        solution = self.llm_handler.get_error_solution(error_context, use_cache=self.use_cache)
+        return self._result(failure, solution, 'model', start)
+
+    def _result(self, failure, solution, source, start):
+        ok = bool(solution) and not solution.startswith('Error:')
+        return {
+            'fingerprint': failure['fingerprint'],
+            'command': failure['command'],
+            'exit_code': failure['exit_code'],
+            'occurrences': failure['occurrences'],
+            'ok': ok,
+            'source': source,
+            'solution': solution if ok else None,
+            'error': None if ok else solution,
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+    def run(self, failures):
+        """Yield result records as analyses finish (completion order)"""
+        knowledge_base = self._knowledge_base() if self.use_cache else None
+        pending = []
+        # Accepted fixes are answered up front; only the rest reach the model
+        for failure in failures:
+            start = time.perf_counter()
+            solution = None
+            if knowledge_base and error_template(failure['error_output']):  # See ErrorInterceptor._iter_solution
+                solution = knowledge_base.lookup(failure['fingerprint'])
+            if solution:
+                yield self._result(failure, solution, 'knowledge_base', start)
+            else:
+                pending.append(failure)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.analyze, failure) for failure in pending]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import threading
+import time
+from .helpers import get_state_dir
+
+# Persistent key/value caches (man excerpts, LLM responses, ...). Each cache is
+# its own SQLite file in the state directory so they can be cleared and sized
+# independently. Values are stored as JSON.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class DiskCache:
+    """SQLite-backed cache with optional TTL and LRU eviction by count/bytes"""
+
+    def __init__(self, name, max_entries=1000, max_bytes=None, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = get_state_dir() / f"{name}.db"
+        # Shared by worker threads (cache warming, batch modes); the lock keeps
+        # their transactions from interleaving
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), timeout=2, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, counting the hit or miss"""
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                'SELECT value, created FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._bump('misses')
+                return default
+            self.conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self._bump('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store value under key, evicting least recently used entries"""
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, created, accessed) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, data, len(data), now, now)
+            )
+            self._evict()
+
+    def __contains__(self, key):
+        with self._lock:
+            row = self.conn.execute('SELECT created FROM entries WHERE key = ?', (key,)).fetchone()
+        return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def stats(self):
+        """Hit/miss counters plus current entry count and size"""
+        with self._lock:
+            counters = dict(self.conn.execute('SELECT name, value FROM stats').fetchall())
+            entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'bytes': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0
+        }
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM entries')
+            self.conn.execute('DELETE FROM stats')
+
+    def _bump(self, counter):
+        self.conn.execute(
+            'INSERT INTO stats (name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (counter,)
+        )
+
+    def _evict(self):
+        entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if self.max_entries is not None and entries > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM entries WHERE key IN '
+                '(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)',
+                (entries - self.max_entries,)
+            )
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Walk from the oldest access until enough bytes are freed
+            excess = size - self.max_bytes
+            doomed = []
+            for key, entry_size in self.conn.execute('SELECT key, size FROM entries ORDER BY accessed ASC'):
+                doomed.append((key,))
+                excess -= entry_size
+                if excess <= 0:
+                    break
+            self.conn.executemany('DELETE FROM entries WHERE key = ?', doomed)
+
+    def close(self):
+        self.conn.close()
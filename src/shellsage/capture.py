@@ -0,0 +1,26 @@
+import os
+
+# The shell hook writes the stderr of each command to its own file, keeping
+# only the last CAPTURE_MAX_BYTES (the hook's `tail -c` uses the same value).
+# Reading is capped as well, for files written by other means.
+
+CAPTURE_MAX_BYTES = 64 * 1024
+
+
+def read_captured_stderr(path, max_bytes=CAPTURE_MAX_BYTES):
+    """Return the last max_bytes of a captured stderr file ('' if unavailable)"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read(max_bytes)
+    except OSError:
+        return ''
+
+    if size > max_bytes:
+        # Drop the partial first line left by seeking into the middle
+        newline = data.find(b'\n')
+        if newline != -1:
+            data = data[newline + 1:]
+    return data.decode('utf-8', errors='replace').strip()
@@ -1,19 +1,100 @@
-import sys
 import click
 import os
-import subprocess
-import inquirer
-from .error_interceptor import ErrorInterceptor
-from .command_generator import CommandGenerator
-from .model_manager import ModelManager, PROVIDERS
-from .helpers import update_env_file, update_env_variable
-from dotenv import load_dotenv
-import re
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.syntax import Syntax
-from rich.columns import Columns
+from .model_manager import PROVIDERS
+
+# The stderr of each interactive command is captured so `--analyze` reads what
+# actually failed instead of re-running it. Only the command's own stderr is
+# captured: right before it runs (DEBUG trap), fd 2 is pointed at a new FIFO in
+# a private per-session directory (mktemp -d under umask 077), and it is pointed
+# back at the terminal before the prompt is handled, so the prompt and
+# readline's echo never reach the capture. Bash's job notices ("[1]+  Done
+# make", "[1] 4242"), which it prints on the same fd while the command runs,
+# are filtered out of it.
+#
+# A reader started for each command tees the stream to the terminal and keeps
+# only its last 64 KiB (capture.CAPTURE_MAX_BYTES) in memory, so its file never
+# grows past that however much the command writes. The file is written when
+# the command closes its stderr; the reader then reports the command's start
+# time on the session's done FIFO, and after a failure the prompt waits up to a second
+# for that report (a background job still holding stderr open only costs that
+# second). Each command has its own FIFO and file, removed once its prompt has
+# been handled, so a background job that keeps its stderr never holds up or
+# overwrites a later command's capture. Readers are started in a nested subshell so the user's $! is left alone.
+#
+# The hook relies on bash's DEBUG trap and PROMPT_COMMAND and does nothing in
+# other shells. Set SHELLSAGE_CAPTURE_STDERR=0 before the hook to disable
+# capturing.
+SHELL_HOOK = r"""
+if [ -n "$BASH_VERSION" ]; then
+export SHELLSAGE_SESSION=$$
+SHELLSAGE_HISTORY_SPOOL="${SHELLSAGE_HOME:-${XDG_STATE_HOME:-$HOME/.local/state}/shellsage}/history.spool"
+(umask 077; mkdir -p "${SHELLSAGE_HISTORY_SPOOL%/*}")
+SHELLSAGE_CAPTURE_DIR=
+if [ "${SHELLSAGE_CAPTURE_STDERR:-1}" != "0" ]; then
+    SHELLSAGE_CAPTURE_DIR=$(umask 077; mktemp -d "${XDG_RUNTIME_DIR:-${TMPDIR:-/tmp}}/shellsage.XXXXXX" 2>/dev/null)
+    if [ -z "$SHELLSAGE_CAPTURE_DIR" ] || ! mkfifo -m 600 "$SHELLSAGE_CAPTURE_DIR/done.fifo"; then
+        SHELLSAGE_CAPTURE_DIR=
+    else
+        exec {SHELLSAGE_TTY_FD}>&2
+        exec {SHELLSAGE_DONE_FD}<>"$SHELLSAGE_CAPTURE_DIR/done.fifo"  # Read-write: opening never blocks
+        trap 'rm -rf "$SHELLSAGE_CAPTURE_DIR"' EXIT
+    fi
+fi
+if [ "${SHELLSAGE_WARM_ON_START:-0}" = "1" ]; then
+    (shellsage warm --quiet >/dev/null 2>&1 &)  # Load the local model while the user types
+fi
+shell_sage_preexec() {
+    [ -n "$SHELLSAGE_AT_PROMPT" ] || return
+    [ "$BASH_COMMAND" = "$PROMPT_COMMAND" ] && return  # Empty command line
+    SHELLSAGE_AT_PROMPT=
+    SHELLSAGE_CMD_RAN=1
+    SHELLSAGE_CMD_START=$EPOCHREALTIME
+    local FIFO="$SHELLSAGE_CAPTURE_DIR/fifo.$SHELLSAGE_CMD_START"
+    if [ -n "$SHELLSAGE_CAPTURE_DIR" ] && mkfifo -m 600 "$FIFO"; then
+        ( (tee /dev/fd/2 < "$FIFO" |
+           grep -a -v -E '^\[[0-9]+\]([-+ ]  [A-Z]| [0-9]+$)' | tail -c 65536 > "$SHELLSAGE_CAPTURE_DIR/stderr.$SHELLSAGE_CMD_START"
+           echo "$SHELLSAGE_CMD_START" 2>/dev/null > "$SHELLSAGE_CAPTURE_DIR/done.fifo") & )
+        exec 2> "$FIFO"
+    fi
+}
+shell_sage_prompt() {
+    local EXIT=$?
+    local CMD=$(fc -ln -1 | awk '{$1=$1}1' | sed 's/\\/\\\\/g')
+    if [ -n "$SHELLSAGE_CMD_RAN" ]; then
+        local DONE STDERR_LOG=
+        if [ -n "$SHELLSAGE_CAPTURE_DIR" ]; then
+            exec 2>&$SHELLSAGE_TTY_FD
+            STDERR_LOG="$SHELLSAGE_CAPTURE_DIR/stderr.$SHELLSAGE_CMD_START"
+        fi
+        if [ $EXIT -ne 0 ]; then
+            while [ -n "$STDERR_LOG" ] && read -r -t 1 -u $SHELLSAGE_DONE_FD DONE; do
+                [ "$DONE" = "$SHELLSAGE_CMD_START" ] && break  # Older ones are from background jobs
+            done
+            shellsage run --analyze "$CMD" --exit-code $EXIT \
+                --stderr-file "$STDERR_LOG" --started-at "$SHELLSAGE_CMD_START"
+        else
+            while [ -n "$STDERR_LOG" ] && read -r -t 0 -u $SHELLSAGE_DONE_FD && read -r -u $SHELLSAGE_DONE_FD DONE; do
+                :  # Drop the reports of finished readers nobody waited for
+            done
+            # Successful commands are spooled without starting Python
+            printf '%s\t%s\t%s\t%s\t%s\t%s\n' "$SHELLSAGE_CMD_START" "$EPOCHREALTIME" \
+                "$SHELLSAGE_SESSION" "$EXIT" "$PWD" "$CMD" >> "$SHELLSAGE_HISTORY_SPOOL"
+        fi
+        [ -n "$STDERR_LOG" ] && rm -f "$STDERR_LOG" "$SHELLSAGE_CAPTURE_DIR/fifo.$SHELLSAGE_CMD_START"
+    fi
+    history -s "$CMD"  # Force into session history
+    SHELLSAGE_CMD_RAN=
+    SHELLSAGE_AT_PROMPT=1
+}
+trap 'shell_sage_preexec' DEBUG
+PROMPT_COMMAND="shell_sage_prompt"
+fi
+"""
+
+# Each command imports its own dependencies, and model_manager imports the
+# provider SDKs, requests and inquirer inside the methods that use them:
+# `run --analyze` is executed by the shell hook after every failed command, so
+# none of them may be paid for at module import time.
 
 @click.group()
 def cli():
@@ -23,11 +104,25 @@ def cli():
 @click.argument('command', nargs=-1)
 @click.option('--analyze', is_flag=True, hidden=True)
 @click.option('--exit-code', type=int, hidden=True)
-def run(command, analyze, exit_code):
+@click.option('--stderr-file', type=click.Path(dir_okay=False), hidden=True)
+@click.option('--rerun', is_flag=True, help='Re-execute the failed command when no stderr was captured')
+@click.option('--started-at', hidden=True, help='Epoch time the command started (from the hook)')
+@click.option('--no-cache', is_flag=True, help='Bypass the response cache')
+def run(command, analyze, exit_code, stderr_file, rerun, started_at, no_cache):
     """Execute command with error analysis"""
-    interceptor = ErrorInterceptor()
+    from .error_interceptor import ErrorInterceptor
+
+    interceptor = ErrorInterceptor(use_cache=not no_cache)
     if analyze:
-        interceptor.auto_analyze(' '.join(command), exit_code)
+        try:
+            # $EPOCHREALTIME uses the locale's decimal separator
+            started_at = float(started_at.replace(',', '.')) if started_at else None
+        except ValueError:
+            started_at = None
+        interceptor.auto_analyze(
+            ' '.join(command), exit_code,
+            stderr_file=stderr_file, rerun=rerun, started_at=started_at
+        )
     else:
         interceptor.run_command(command)
 
@@ -36,38 +131,130 @@ def run(command, analyze, exit_code):
 @cli.command()
 @click.argument('query', nargs=-1, required=True)
 @click.option('--execute', is_flag=True, help='Execute commands with safety checks')
-def ask(query, execute):
+@click.option('--no-cache', is_flag=True, help='Bypass the response cache')
+def ask(query, execute, no_cache):
     """Generate and execute commands with safety checks"""
+    import subprocess
+    from rich.console import Console
+    from rich.live import Live
+    from .error_interceptor import ErrorInterceptor
+    from .helpers import distribution_name
+    from .profiling import span
+
     console = Console()
-    generator = CommandGenerator()
     interceptor = ErrorInterceptor()
 
-    # Add distro detection at the top of the ask command
-    try:
-        with open('/etc/os-release') as f:
-            dist_info = {k.lower(): v.strip('"') for k,v in 
-                        [line.split('=') for line in f if '=' in line]}
-        dist_name = dist_info.get('pretty_name', 'Linux')
-    except FileNotFoundError:
-        import platform
-        dist_name = f"{platform.system()} {platform.release()}"
-
     context = {
-        'os': dist_name,
+        'os': distribution_name(),
         'cwd': os.getcwd(),
         'git': os.path.exists('.git'),
-        'history': interceptor.command_history
+        'history': list(interceptor.command_history)
     }
     
-    results = generator.generate_commands(' '.join(query), context)
+    results = []  # Stays empty if neither the daemon nor the fallback answers
+    if console.is_terminal and os.getenv('SHELLSAGE_STREAM', '1') != '0':
+        # Render progressively: the command panel appears as soon as its line is complete
+        with span('ask', streaming=True), Live(console=console, refresh_per_second=10) as live:
+            for results in _iter_ask_results(' '.join(query), context, not no_cache, stream=True):
+                live.update(_render_ask_results(results, streaming=True))
+            live.update(_render_ask_results(results))
+    else:
+        with span('ask', streaming=False):
+            for results in _iter_ask_results(' '.join(query), context, not no_cache, stream=False):
+                pass
+        with span('render'):
+            console.print(_render_ask_results(results))
     
+    command_item = next((i for i in results if i['type'] == 'command'), None)
+    if execute and command_item and command_item['content']:
+        if console.input("\n[bold gold1]› Execute command?[/] [[y]/n]: ").lower() != 'n':
+            subprocess.run(command_item['content'], shell=True)
+
+
+@cli.command('ask-batch')
+@click.argument('queries', type=click.File('r'), default='-')
+@click.option('--concurrency', type=int, default=4, show_default=True, help='Requests running at once')
+@click.option('--rate', type=float, help='Requests per minute per provider (default: provider free-tier limit)')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='JSONL results (default: stdout)')
+@click.option('--no-cache', is_flag=True, help='Bypass the response cache')
+def ask_batch(queries, concurrency, rate, output, no_cache):
+    """Generate commands for many queries (one per line or JSONL, stdin by default)"""
+    import json
+    import time
+    from .batch import RateLimiter, ask_record, parse_queries
+    from .command_generator import CommandGenerator
+    from .helpers import distribution_name
+
+    # Shared by every query instead of being rebuilt per process
+    context = {
+        'os': distribution_name(),
+        'cwd': os.getcwd(),
+        'git': os.path.exists('.git'),
+        'history': []
+    }
+    generator = CommandGenerator()
+    generator.manager.rate_limiter = RateLimiter(rate, burst=concurrency)
+
+    start = time.perf_counter()
+    count = failed = 0
+    try:
+        for query, results in generator.generate_batch(
+            parse_queries(queries), context, use_cache=not no_cache, concurrency=concurrency
+        ):
+            record = ask_record(query, results)
+            count += 1
+            failed += not record['ok']
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    elapsed = time.perf_counter() - start
+    per_minute = count * 60 / elapsed if elapsed else 0
+    click.echo(f"Generated {count} in {elapsed:.1f}s ({per_minute:.1f}/min), {failed} without a command", err=True)
+
+
+def _iter_ask_results(query, context, use_cache, stream):
+    """Results from a running daemon, or generated in-process"""
+    from .daemon import request_daemon, stream_daemon
+
+    try:
+        if stream:
+            partials = stream_daemon('ask', query=query, context=context, use_cache=use_cache)
+            if partials is not None:
+                yield from partials
+                return
+        else:
+            results = request_daemon('ask', query=query, context=context, use_cache=use_cache)
+            if results is not None:
+                yield results
+                return
+    except Exception as e:
+        yield [{'type': 'warning', 'content': f"Error: {str(e)}"}]
+        return
+
+    from .command_generator import CommandGenerator
+    yield from CommandGenerator().stream_commands(query, context, use_cache=use_cache, stream=stream)
+
+
+def _render_ask_results(results, streaming=False):
+    """Build the ask display; `streaming` renders partial results"""
+    from rich.console import Group
+    from rich.panel import Panel
+    from rich.syntax import Syntax
+    from rich.columns import Columns
+    from .response_parser import strip_code
+
+    results = results or []
+    blocks = []
+
     # Command Analysis Display
-    console.print(Panel.fit("[bold cyan]COMMAND ANALYSIS[/]", style="cyan"))
+    blocks.append(Panel.fit("[bold cyan]COMMAND ANALYSIS[/]", style="cyan"))
     
     # Thinking Process
     thinking_items = [item for item in results if item['type'] == 'thinking']
     if thinking_items:
-        console.print(Panel.fit(
+        blocks.append(Panel.fit(
             "\n".join(f"[dim]› {item['content']}[/dim]" for item in thinking_items),
             title="[gold1]Thinking Process[/]",
             border_style="gold1",
@@ -81,6 +268,8 @@ def ask(query, execute):
     details_col = []
     
     for item in results:
+        if not item['content']:
+            continue
         if item['type'] == 'warning':
             analysis_col.append(f"[red]⚠ {item['content']}[/]")
         elif item['type'] == 'analysis':
@@ -88,50 +277,293 @@ def ask(query, execute):
         elif item['type'] == 'details':
             details_col.append(f"[dim]{item['content']}[/]")
     
-    console.print(Columns([
+    blocks.append(Columns([
         Panel.fit("\n".join(analysis_col), title="[blue]Analysis[/]", padding=(0, 1)),
         Panel.fit("\n".join(details_col), title="[grey70]Technical Details[/]", padding=(0, 1))
     ], equal=True, expand=False))
     
     if command_item and command_item['content']:
         # Clean markdown backticks before display
-        clean_command = command_item['content'].strip('`').strip()
-        console.print(Panel.fit(
+        clean_command = strip_code(command_item['content'])
+        blocks.append(Panel.fit(
             Syntax(clean_command, "bash", theme="monokai", line_numbers=False),
             title="[green]Generated Command[/]",
             border_style="green",
             padding=0
         ))
-        
-        if execute:
-            if console.input("\n[bold gold1]› Execute command?[/] [[y]/n]: ").lower() != 'n':
-                subprocess.run(command_item['content'], shell=True)
-    else:
-        console.print(Panel.fit(
+    elif not streaming:
+        blocks.append(Panel.fit(
             "No valid command generated",
             style="red"
         ))
 
+    return Group(*blocks)
+
+@cli.group()
+def daemon():
+    """Resident background service that keeps models and clients warm"""
+
+
+@daemon.command('start')
+@click.option('--detach', is_flag=True, help='Run in the background')
+def daemon_start(detach):
+    """Start the daemon (foreground unless --detach)"""
+    from .daemon import ShellSageDaemon, request_daemon, socket_path
+
+    if request_daemon('ping') is not None:
+        click.echo(f"✅ Daemon already running on {socket_path()}")
+        return
+
+    if detach:
+        import subprocess
+        import sys
+        subprocess.Popen(
+            [sys.executable, '-m', 'shellsage.cli', 'daemon', 'start'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        click.echo("✅ Daemon starting in the background")
+        return
+
+    try:
+        server = ShellSageDaemon()
+    except (PermissionError, RuntimeError) as e:
+        click.echo(f"❌ {str(e)}", err=True)
+        return
+    click.echo(f"✅ Daemon listening on {server.path} (mode: {server.manager.mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@daemon.command('stop')
+def daemon_stop():
+    """Stop a running daemon"""
+    from .daemon import request_daemon
+
+    if request_daemon('shutdown') is None:
+        click.echo("❌ No daemon running")
+    else:
+        click.echo("✅ Daemon stopped")
+
+
+@daemon.command('status')
+def daemon_status():
+    """Show whether a daemon is running"""
+    from .daemon import request_daemon, socket_path
+
+    info = request_daemon('ping', timeout=2)
+    if info is None:
+        click.echo("Daemon: not running")
+    else:
+        click.echo(f"Daemon: running (pid {info['pid']}, mode {info['mode']}) on {socket_path()}")
+        for endpoint, stats in sorted(info.get('http', {}).items()):
+            latency = f", p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms" if stats['count'] else ''
+            click.echo(f"  {endpoint}: {stats['count']} ok, {stats['errors']} failed{latency}")
+        click.echo(f"  Prompt tokens sent: {info.get('prompt_tokens', 0)}")
+
+@cli.group()
+def cache():
+    """Inspect and prepare ShellSage's on-disk caches"""
+
+
+@cache.command('warm-man')
+@click.option('--workers', type=int, default=4, show_default=True, help='Parallel man renderers')
+def cache_warm_man(workers):
+    """Precompute man page excerpts for every executable on PATH"""
+    from .man_pages import ManPageCache, path_executables
+
+    commands = path_executables()
+    click.echo(f"Scanning {len(commands)} executables on PATH...")
+    rendered = ManPageCache().warm(commands, workers=workers)
+    click.echo(f"✅ Cached {rendered} new man page excerpts")
+
+
+def _open_caches():
+    from .man_pages import ManPageCache
+    from .response_cache import ResponseCache
+
+    return {
+        'man excerpts': ManPageCache().cache,
+        'responses': ResponseCache().cache
+    }
+
+
+@cache.command('stats')
+def cache_stats():
+    """Show cache sizes and hit rates"""
+    for name, disk_cache in _open_caches().items():
+        stats = disk_cache.stats()
+        click.echo(
+            f"{name}: {stats['entries']} entries, {stats['bytes']} bytes, "
+            f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})"
+        )
+
+
+@cache.command('clear')
+def cache_clear():
+    """Remove all cached entries"""
+    for disk_cache in _open_caches().values():
+        disk_cache.clear()
+    click.echo("✅ Caches cleared")
+
+
 @cli.command()
-def install():
+def backends():
+    """Show recorded latency and circuit breaker state per backend"""
+    from .backend_stats import BackendStats
+
+    summary = BackendStats().summary()
+    if not summary:
+        click.echo("No generations recorded yet")
+    for backend, stats in sorted(summary.items()):
+        latency = f", p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s" if stats['count'] else ''
+        state = '' if stats['state'] == 'closed' else f" [circuit {stats['state'].replace('_', '-')}]"
+        click.echo(f"{backend}: {stats['count']} ok, {stats['errors']} failed{latency}{state}")
+
+
+@cli.command('analyze-log')
+@click.argument('log', type=click.File('r'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'jsonl', 'text']), default='auto', show_default=True)
+@click.option('--concurrency', type=int, default=4, show_default=True, help='Analyses running at once')
+@click.option('--rate', type=float, help='Requests per minute per provider (default: provider free-tier limit)')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='JSONL results (default: stdout)')
+@click.option('--no-cache', is_flag=True, help='Bypass the response cache and knowledge base')
+def analyze_log(log, fmt, concurrency, rate, output, no_cache):
+    """Analyze the failures in a CI log or JSONL file (stdin by default)"""
+    import json
+    import time
+    from .batch import BatchAnalyzer, dedupe, parse_failures
+
+    start = time.perf_counter()
+    try:
+        failures = list(parse_failures(log, fmt))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    unique = dedupe(failures)
+    click.echo(f"{len(failures)} failures, {len(unique)} unique", err=True)
+
+    analyzer = BatchAnalyzer(concurrency=concurrency, rate=rate, use_cache=not no_cache)
+    failed = 0
+    for result in analyzer.run(unique):
+        failed += not result['ok']
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+
+    elapsed = time.perf_counter() - start
+    per_minute = len(unique) * 60 / elapsed if elapsed else 0
+    click.echo(f"Analyzed {len(unique)} in {elapsed:.1f}s ({per_minute:.1f}/min), {failed} failed", err=True)
+
+
+@cli.group()
+def kb():
+    """Local knowledge base of accepted fixes"""
+
+
+@kb.command('accept')
+@click.option('--any-session', is_flag=True, help='Accept the latest analysis from any shell')
+def kb_accept(any_session):
+    """Remember the last analysis of this shell as the fix for its error"""
+    from .knowledge_base import KnowledgeBase
+    from .history_store import session_id
+
+    fingerprint = KnowledgeBase().accept_pending(None if any_session else session_id())
+    if fingerprint is None:
+        click.echo("❌ No recent analysis to accept")
+    else:
+        click.echo(f"✅ Fix saved for error fingerprint {fingerprint}")
+
+
+@kb.command('list')
+def kb_list():
+    """Show accepted fixes"""
+    from .knowledge_base import KnowledgeBase
+
+    for entry in KnowledgeBase().entries():
+        first_line = (entry['template'] or '').split('\n')[0]
+        click.echo(f"{entry['fingerprint']}  {entry['command_base']:<16} {entry['hits']:>4} hits  {first_line}")
+
+
+@kb.command('forget')
+@click.argument('fingerprint')
+def kb_forget(fingerprint):
+    """Remove an accepted fix"""
+    from .knowledge_base import KnowledgeBase
+
+    if KnowledgeBase().forget(fingerprint):
+        click.echo(f"✅ Forgot {fingerprint}")
+    else:
+        click.echo(f"❌ Unknown fingerprint {fingerprint}")
+
+
+@cli.command()
+@click.option('--keep-alive', help='How long Ollama keeps the model loaded (e.g. 10m, 1h, -1 for ever)')
+@click.option('--unload', is_flag=True, help='Release the model instead of loading it')
+@click.option('--quiet', is_flag=True, help='Only report errors')
+def warm(keep_alive, unload, quiet):
+    """Preload the local model so the next analysis skips load time"""
+    from .daemon import request_daemon
+    from .model_manager import ModelManager
+
+    try:
+        manager = ModelManager()
+        # Models loaded in-process would die with this command: only the daemon can hold them
+        in_daemon = manager.local_provider != 'ollama'
+        if unload:
+            if in_daemon:
+                if request_daemon('unload') is None:
+                    raise RuntimeError("No daemon running, nothing to release")
+            else:
+                manager.unload()
+            if not quiet:
+                click.echo(f"✅ Released {manager.local_model}")
+            return
+        if in_daemon:
+            result = request_daemon('warm', keep_alive=keep_alive)
+            if result is None:
+                raise RuntimeError(
+                    f"Warming {manager.local_provider} models needs a running daemon: shellsage daemon start"
+                )
+        else:
+            result = manager.preload(keep_alive)
+    except Exception as e:
+        click.echo(f"❌ {str(e)}", err=True)
+        raise SystemExit(1)
+    if quiet:
+        return
+    kept = 'daemon lifetime' if in_daemon else keep_alive or manager.keep_alive
+    if result['load_seconds'] < 0.05:
+        click.echo(f"✅ {result['model']} already loaded ({result['seconds']:.2f}s, keep-alive {kept})")
+    else:
+        click.echo(f"✅ Loaded {result['model']} in {result['load_seconds']:.2f}s "
+                   f"({result['seconds']:.2f}s total, keep-alive {kept})")
+
+
+@cli.command()
+@click.option('--raw', is_flag=True, help='Print only the hook (for scripts)')
+def install(raw):
     """Install automatic error handling"""
-    hook = r"""
-shell_sage_prompt() {
-    local EXIT=$?
-    local CMD=$(fc -ln -1 | awk '{$1=$1}1' | sed 's/\\/\\\\/g')
-    [ $EXIT -ne 0 ] && shellsage run --analyze "$CMD" --exit-code $EXIT
-    history -s "$CMD"  # Force into session history
-}
-PROMPT_COMMAND="shell_sage_prompt"
-"""
+    if raw:
+        click.echo(SHELL_HOOK.strip())
+        return
     click.echo("# Add this to your shell config:")
-    click.echo(hook)
+    click.echo(SHELL_HOOK)
     click.echo("\n# Then run: source ~/.bashrc")
 
 @cli.command()
 def setup():
     """Interactive configuration setup"""
-    if not os.path.exists('.env'):
+    import inquirer
+    from .config import env_path, load_config
+    from .model_manager import ModelManager
+    from .helpers import update_env_variables
+
+    if not env_path().is_file():
         click.echo("❌ Missing .env file - clone the repository properly")
         return
 
@@ -161,13 +593,11 @@ def setup():
             default=os.getenv('LOCAL_MODEL')
         )
         answers = inquirer.prompt([model_q])
-        update_env_variable('LOCAL_MODEL', answers['model'])
-        update_env_variable('MODE', 'local')
+        update_env_variables({'LOCAL_MODEL': answers['model'], 'MODE': 'local'})
         click.echo(f"✅ Local mode configured with model: {answers['model']}")
         
     elif mode == 'api':
         # API provider selection
-        update_env_variable('MODE', 'api')
         provider_q = inquirer.List(
             'provider',
             message="Select API Provider:",
@@ -177,18 +607,16 @@ def setup():
         provider = answers['provider']
         
         # Key entry for any provider
-        with open('.env') as f:
-            env_content = f.read()
-        existing_key = re.search(f"{provider.upper()}_API_KEY=(.*)", env_content)
+        changes = {'MODE': 'api'}
+        existing_key = load_config().values.get(f"{provider.upper()}_API_KEY")
         
-        if not existing_key or not existing_key.group(1).strip():
+        if not existing_key or not existing_key.strip():
             key_q = inquirer.Text(
                 'key',
                 message=f"Enter {provider} API key:"
             )
             key_answers = inquirer.prompt([key_q])
-            update_env_file(provider, key_answers['key'])
-            load_dotenv(override=True)
+            changes[f"{provider.upper()}_API_KEY"] = key_answers['key']
 
         # Model selection for chosen provider
         models = PROVIDERS[provider]['models']
@@ -198,8 +626,9 @@ def setup():
             choices=models
         )
         model_answers = inquirer.prompt([model_q])
-        update_env_variable('ACTIVE_API_PROVIDER', provider)
-        update_env_variable('API_MODEL', model_answers['model'])
+        changes.update({'ACTIVE_API_PROVIDER': provider, 'API_MODEL': model_answers['model']})
+        # One write for the whole answer set
+        update_env_variables(changes)
         click.echo(f"✅ API mode configured with {provider}/{model_answers['model']}")
 
 @cli.command()
@@ -208,21 +637,28 @@ def setup():
 @click.option('--model', help="Specify model name")
 def config(mode, provider, model):
     """Configure operation mode and models"""
+    import inquirer
+    from .model_manager import ModelManager
+    from .helpers import update_env_variables
+
     manager = ModelManager()
     
     if mode == 'local':
-        models = manager.get_ollama_models()
-        question = [
-            inquirer.List('model',
-                message="Select local model:",
-                choices=models,
-                default=os.getenv('LOCAL_MODEL')
-            )
-        ]
-        answers = inquirer.prompt(question)
-        update_env_variable('LOCAL_MODEL', answers['model'])
-        update_env_variable('MODE', 'local')
-        click.echo(f"✅ Switched to local mode using {answers['model']}")
+        if model:
+            if manager.local_provider == 'ollama' and manager.catalog.find(model) is None:
+                click.echo(f"❌ Model {model} is not installed (ollama pull {model})")
+                return
+        else:
+            question = [
+                inquirer.List('model',
+                    message="Select local model:",
+                    choices=manager.get_ollama_models(),
+                    default=os.getenv('LOCAL_MODEL')
+                )
+            ]
+            model = inquirer.prompt(question)['model']
+        update_env_variables({'LOCAL_MODEL': model, 'MODE': 'local'})
+        click.echo(f"✅ Switched to local mode using {model}")
             
     elif mode == 'api':
         if not provider:
@@ -234,20 +670,15 @@ def config(mode, provider, model):
             )
             provider = inquirer.prompt([provider_q])['provider']
         
-        # Update provider FIRST before checking key
-        update_env_variable('ACTIVE_API_PROVIDER', provider)
-        load_dotenv(override=True)
-        
-        # Now check key in updated environment
-        key = os.getenv(f"{provider.upper()}_API_KEY")
+        changes = {'ACTIVE_API_PROVIDER': provider}
+        key = manager.config.api_key(provider)
         if not key:
             key_q = inquirer.Text(
                 'key',
                 message=f"Enter {provider} API key:"
             )
             key_answers = inquirer.prompt([key_q])
-            # Update .env
-            update_env_variable(f"{provider.upper()}_API_KEY", key_answers['key'])
+            changes[f"{provider.upper()}_API_KEY"] = key_answers['key']
 
         # Model selection
         models = PROVIDERS[provider]['models']
@@ -259,40 +690,46 @@ def config(mode, provider, model):
             )
             model = inquirer.prompt([model_q])['model']
         
-        # Update config
-        manager.switch_mode('api', model_name=model)
+        manager.switch_mode('api', model_name=model, settings=changes)
         click.echo(f"✅ Switched to API mode using {provider}/{model}")
         
     else:
-        current_mode = manager.config['mode']
+        current_mode = manager.config.mode
         click.echo(f"Current mode: {current_mode}")
         if current_mode == 'local':
-            click.echo(f"Local model: {manager.config['local']['model']}")
+            click.echo(f"Local model: {manager.config.local_model}")
         else:
-            provider = os.getenv('ACTIVE_API_PROVIDER', 'groq')
-            click.echo(f"API Provider: {provider}")
+            click.echo(f"API Provider: {manager.config.api_provider}")
 
 @cli.command()
 @click.option('--provider', type=click.Choice(['ollama', 'huggingface']))
-def models(provider):
+@click.option('--refresh', is_flag=True, help='Re-read the Ollama model catalog now')
+def models(provider, refresh):
     """Manage local models"""
-    manager = ModelManager()
-    
+    from .model_manager import ModelManager
+    from .helpers import update_env_variables
+
     if provider:
-        manager.config['local']['provider'] = provider
-        manager._save_config()
+        # Anything but ollama runs through ctransformers
+        update_env_variables({'LOCAL_PROVIDER': 'ollama' if provider == 'ollama' else 'ctransformers'})
+    manager = ModelManager()
     
-    click.echo(f"Local provider: {manager.config['local']['provider']}")
+    click.echo(f"Local provider: {manager.local_provider}")
     
-    if manager.config['local']['provider'] == 'ollama':
-        models = manager.get_ollama_models()
+    if manager.local_provider == 'ollama':
         click.echo("\nInstalled Ollama models:")
+        for entry in manager.catalog.models(refresh=refresh):
+            details = [
+                entry['parameter_size'],
+                entry['quantization'],
+                f"{entry['size'] / 1e9:.1f} GB" if entry['size'] else None,
+                f"ctx {entry['context_length']}" if entry['context_length'] else None
+            ]
+            details = ', '.join(d for d in details if d)
+            click.echo(f"- {entry['name']}" + (f"  ({details})" if details else ''))
     else:
-        models = manager._get_hf_models()
-        click.echo("\nInstalled HuggingFace models:")
-        
-    for model in models:
-        click.echo(f"- {model}")    
+        click.echo("\nConfigured HuggingFace model:")
+        click.echo(f"- {manager.local_model}")
 
 
 if __name__ == "__main__":
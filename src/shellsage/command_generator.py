@@ -1,38 +1,90 @@
-import os
-import re
 from .model_manager import ModelManager
+from .profiling import span
+from .response_cache import ResponseCache, cache_disabled
+from .response_parser import COMMAND_SECTIONS, ResponseParser, command_results, parse
 
 
 class CommandGenerator:
-    def __init__(self):
-        self.manager = ModelManager()
-    
-    def generate_commands(self, query, context=None):
+    def __init__(self, manager=None):
+        # Optional shared manager, as in DeepSeekLLMHandler
+        self.manager = manager or ModelManager()
+        self._response_cache = None
+
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache()
+        return self._response_cache
+
+    def generate_commands(self, query, context=None, use_cache=True):
+        results = None
+        for results in self.stream_commands(query, context, use_cache=use_cache, stream=False):
+            pass
+        return results
+
+    def generate_batch(self, queries, context=None, use_cache=True, concurrency=4):
+        """Yield (query, results) for every query, in input order
+
+        All queries share `context` and this generator's ModelManager, so
+        clients and pooled connections are reused; at most `concurrency`
+        requests are in flight at once.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        concurrency = max(1, concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = []
+            # Submit lazily so a huge (or endless) stdin is not read up front
+            for query in queries:
+                pending.append((query, executor.submit(self.generate_commands, query, context, use_cache)))
+                if len(pending) >= concurrency * 2:
+                    query, future = pending.pop(0)
+                    yield query, future.result()
+            for query, future in pending:
+                yield query, future.result()
+
+    def stream_commands(self, query, context=None, use_cache=True, stream=True):
+        """Yield the parsed results so far each time a response line completes.
+
+        The last value yielded is the complete result list.
+        """
+        context = context or {}
+        use_cache = use_cache and not cache_disabled()
+        if use_cache:
+            cache_key = ResponseCache.make_key(
+                'ask',
+                self.manager.backend_identity(),
+                query=query,
+                os=context.get('os'),
+                git=bool(context.get('git')),
+                cwd=context.get('cwd')  # The prompt names the directory
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
         try:
-            prompt = self._build_prompt(query, context)
-            response = self.manager.generate(prompt)
-            
-            # Check if response contains thinking tokens
-            has_thinking = '<think>' in response and '</think>' in response
-            
-            if has_thinking:
-                thoughts = []
-                remaining_response = response
-                while '<think>' in remaining_response and '</think>' in remaining_response:
-                    think_start = remaining_response.find('<think>') + len('<think>')
-                    think_end = remaining_response.find('</think>')
-                    if think_start > -1 and think_end > -1:
-                        thought = remaining_response[think_start:think_end].strip()
-                        thoughts.append(thought)
-                        remaining_response = remaining_response[think_end + len('</think>'):]
-                
-                final_response = remaining_response.strip()
-                return self._format_thinking_response(thoughts, final_response)
+            with span('prompt.build'):
+                prompt = self._build_prompt(query, context)
+            parser = ResponseParser(COMMAND_SECTIONS)
+            if stream:
+                # Lines are parsed once, as they arrive
+                chars = 0
+                for chunk in self.manager.generate_stream(prompt, accept=self._is_usable):
+                    chars += len(chunk)
+                    parser.feed(chunk)
+                    if '\n' in chunk:
+                        yield command_results(parser.result())
             else:
-                return self._parse_response(response)
-                
+                response = self.manager.generate(prompt, accept=self._is_usable)
+                chars = len(response or '')
+                parser.feed(response or '')
+            with span('parse', chars=chars):
+                parser.finish()
+                results = command_results(parser.result())
         except Exception as e:
-            return [{
+            yield [{
                 'type': 'warning',
                 'content': f"Error: {str(e)}"
             }, {
@@ -40,6 +92,16 @@ class CommandGenerator:
                 'content': None,
                 'details': None
             }]
+            return
+
+        # Only answers that produced a command are worth replaying
+        if use_cache and any(item['type'] == 'command' and item.get('content') for item in results):
+            self.response_cache.set(cache_key, results)
+        yield results
+
+    def _is_usable(self, response):
+        """Whether a raw response yields a command (hedged races skip others)"""
+        return bool(parse(response, COMMAND_SECTIONS).get('command'))
 
     def _build_prompt(self, query, context):
         # Determine the primary context based on the query and environment
@@ -79,81 +141,3 @@ Query: "update git repo"
 ⚠️ Warning: Ensure working directory is clean before updating
 """
         return system_context
-
-    
-    def _format_thinking_response(self, thoughts, final_response):
-        results = []
-        
-        # Add thinking process to results
-        for thought in thoughts:
-            results.append({
-                'type': 'thinking',
-                'content': thought
-            })
-        
-        # Parse the final response
-        components = self._parse_response(final_response)
-        
-        # Clean up any duplicate sections caused by thinking process
-        seen_types = set()
-        cleaned_components = []
-        
-        for comp in components:
-            if comp['type'] not in seen_types and comp['content']:
-                seen_types.add(comp['type'])
-                # Remove any duplicate content within the same component
-                if isinstance(comp['content'], str):
-                    comp['content'] = '\n'.join(dict.fromkeys(comp['content'].split('\n')))
-                cleaned_components.append(comp)
-        
-        results.extend(cleaned_components)
-        return results
-    
-    
-    def _parse_response(self, response):
-        # Clean up response by removing any remaining XML-like tags
-        cleaned = re.sub(r'<[^>]+>', '', response)
-        
-        components = {
-            'analysis': None,
-            'command': None,
-            'details': None,
-            'warning': None
-        }
-        
-        markers = {
-            'analysis': ['🧠', 'Analysis:'],
-            'command': ['🛠️', 'Command:'],
-            'details': ['📝', 'Details:'],
-            'warning': ['⚠️', 'Warning:']
-        }
-        
-        lines = cleaned.split('\n')
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            for section, section_markers in markers.items():
-                if any(marker in line for marker in section_markers):
-                    current_section = section
-                    for marker in section_markers:
-                        line = line.replace(marker, '').strip()
-                    components[section] = line
-                    break
-            
-            if current_section and not any(
-                marker in line for markers_list in markers.values() 
-                for marker in markers_list
-            ):
-                if components[current_section]:
-                    components[current_section] += '\n' + line
-                else:
-                    components[current_section] = line
-        
-        return [{
-            'type': key,
-            'content': '\n'.join(dict.fromkeys(value.strip().split('\n'))) if value else None
-        } for key, value in components.items()]
\ No newline at end of file
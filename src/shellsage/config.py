@@ -0,0 +1,194 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Settings come from the .env file, applied over the process environment the
+# way load_dotenv(override=True) did. The file is parsed once per change of
+# its mtime/size, however many ModelManagers a command creates. Writes are
+# batched: update_env() rewrites the file once, atomically (temp file +
+# rename) and under an exclusive lock, so concurrent shells running `config`
+# or `setup` never interleave or truncate each other's changes.
+
+DEFAULT_OLLAMA_HOST = 'http://localhost:11434'
+
+_lock = threading.Lock()
+_cached = None  # (path, signature, Config)
+
+
+def env_path():
+    """The .env file in use
+
+    SHELLSAGE_ENV_FILE if set, else the nearest .env above the package (the
+    clone it was installed from, as load_dotenv found it), else `.env` in the
+    working directory, which is also where writes create one.
+    """
+    override = os.getenv('SHELLSAGE_ENV_FILE')
+    if override:
+        return Path(override).expanduser()
+    package_dir = Path(__file__).resolve().parent
+    for directory in package_dir.parents:
+        candidate = directory / '.env'
+        if candidate.is_file():
+            return candidate
+    return Path.cwd() / '.env'
+
+
+def _signature(path):
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _parse(path):
+    from dotenv import dotenv_values
+
+    try:
+        values = dotenv_values(path)
+    except OSError:
+        return {}
+    return {key: value for key, value in values.items() if value is not None}
+
+
+class Config:
+    """Parsed .env values, read through the process environment"""
+
+    def __init__(self, path, values):
+        self.path = path
+        self.values = values
+
+    def get(self, key, default=None):
+        return os.environ.get(key, self.values.get(key, default))
+
+    @property
+    def mode(self):
+        return self.get('MODE', 'local')
+
+    @property
+    def local_model(self):
+        return self.get('LOCAL_MODEL', 'llama3:8b-instruct-q4_1')
+
+    @property
+    def local_provider(self):
+        return self.get('LOCAL_PROVIDER', 'ollama')
+
+    @property
+    def ollama_host(self):
+        return self.get('OLLAMA_HOST', DEFAULT_OLLAMA_HOST)
+
+    @property
+    def api_provider(self):
+        return self.get('ACTIVE_API_PROVIDER', 'groq')
+
+    @property
+    def api_model(self):
+        return self.get('API_MODEL')
+
+    def api_key(self, provider):
+        return self.get(f"{provider.upper()}_API_KEY")
+
+
+def load_config():
+    """The current Config; re-parses and re-applies .env only when it changed"""
+    global _cached
+    path = env_path()
+    signature = _signature(path)
+    with _lock:
+        if _cached is not None and _cached[0] == path and _cached[1] == signature:
+            return _cached[2]
+        values = _parse(path) if signature is not None else {}
+        os.environ.update(values)  # .env wins over the inherited environment
+        config = Config(path, values)
+        _cached = (path, signature, config)
+        return config
+
+
+def config_signature():
+    """(path, mtime/size) of the .env file, to notice changes cheaply"""
+    path = env_path()
+    return (str(path), _signature(path))
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock for writers of `path`, so they queue instead of racing
+
+    The lock file lives in the state directory (one per .env path), not next
+    to .env where it would show up in the checkout.
+    """
+    try:
+        import fcntl
+    except ImportError:  # No flock (Windows): fall back to unlocked writes
+        yield
+        return
+    import hashlib
+    from .helpers import get_state_dir
+
+    digest = hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()[:16]
+    with open(get_state_dir() / f"env-{digest}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _key_of(line):
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#') or '=' not in stripped:
+        return None
+    key = stripped.split('=', 1)[0].strip()
+    return key[len('export '):].strip() if key.startswith('export ') else key
+
+
+def update_env(values, path=None):
+    """Set several .env variables in one atomic write; returns the new Config
+
+    Existing assignments are replaced in place (later duplicates dropped),
+    new ones are appended, and comments and other lines are kept.
+    """
+    global _cached
+    path = Path(path) if path else env_path()
+    values = {key: str(value) for key, value in values.items()}
+    with _file_lock(path):
+        try:
+            lines = path.read_text().splitlines()
+        except FileNotFoundError:
+            lines = []
+        written = set()
+        new_lines = []
+        for line in lines:
+            key = _key_of(line)
+            if key in values:
+                if key not in written:
+                    new_lines.append(f"{key}={values[key]}")
+                    written.add(key)
+                continue
+            new_lines.append(line)
+        new_lines.extend(f"{key}={value}" for key, value in values.items() if key not in written)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.env.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(new_lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, path.stat().st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o600)  # New file holding API keys
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    os.environ.update(values)
+    with _lock:
+        _cached = None
+    return load_config()
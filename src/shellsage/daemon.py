@@ -0,0 +1,257 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+# Requests are single JSON lines over a per-user Unix socket, answered by a
+# single JSON line. Anything that cannot reach a daemon falls back to running
+# in-process, so the daemon is purely an optimization.
+
+CONNECT_TIMEOUT = 0.2
+
+
+def private_dir(path):
+    """Create `path` with mode 0700, or check that an existing one is ours and private
+
+    Raises PermissionError for a directory (or symlink) someone else could
+    have planted, e.g. at a predictable name under /tmp.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by you with mode 0700")
+    return path
+
+
+def socket_path():
+    """Per-user socket location (overridable with SHELLSAGE_SOCKET)
+
+    Without XDG_RUNTIME_DIR the socket lives in a private /tmp/shellsage-<uid>/
+    directory rather than at a name in /tmp any local user could take first.
+    """
+    if os.getenv('SHELLSAGE_SOCKET'):
+        return os.environ['SHELLSAGE_SOCKET']
+    runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, f"shellsage-{os.getuid()}.sock")
+    return os.path.join('/tmp', f"shellsage-{os.getuid()}", 'daemon.sock')
+
+
+def _is_own_socket(path):
+    """Whether path is a socket created by the current user (never follow a squatter's)"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def _connect():
+    """Connected socket to the daemon, or None when none is reachable"""
+    if os.getenv('SHELLSAGE_NO_DAEMON'):
+        return None
+    path = socket_path()
+    if not _is_own_socket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request_daemon(op, timeout=None, **payload):
+    """Send one request to a running daemon.
+
+    Returns the daemon's result, or None when no daemon is reachable so the
+    caller can fall back to in-process execution. Errors raised inside the
+    daemon are re-raised as RuntimeError.
+    """
+    sock = _connect()
+    if sock is None:
+        return None
+    try:
+        sock.settimeout(timeout)
+        message = json.dumps({'op': op, **payload}, default=str) + '\n'
+        sock.sendall(message.encode())
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    finally:
+        sock.close()
+
+    if not line:
+        return None
+    response = json.loads(line)
+    if not response.get('ok'):
+        raise RuntimeError(response.get('error', 'Unknown daemon error'))
+    return response.get('result')
+
+
+def stream_daemon(op, **payload):
+    """Streaming variant of request_daemon.
+
+    Returns None when no daemon is reachable, otherwise a generator of the
+    partial results the daemon sends; the last one is the final result.
+    """
+    sock = _connect()
+    if sock is None:
+        return None
+    sock.settimeout(None)
+    message = json.dumps({'op': op, 'stream': True, **payload}, default=str) + '\n'
+    try:
+        sock.sendall(message.encode())
+    except OSError:
+        sock.close()
+        return None
+
+    def responses():
+        try:
+            with sock.makefile('rb') as reader:
+                for line in reader:
+                    response = json.loads(line)
+                    if 'chunk' in response:
+                        yield response['chunk']
+                    elif not response.get('ok'):
+                        raise RuntimeError(response.get('error', 'Unknown daemon error'))
+                    else:
+                        yield response.get('result')
+                        return
+        finally:
+            sock.close()
+
+    return responses()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if request.get('stream'):
+                result = None
+                for result in self.server.dispatch_stream(request):
+                    self._send({'chunk': result})
+            else:
+                result = self.server.dispatch(request)
+            response = {'ok': True, 'result': result}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        self._send(response)
+
+    def _send(self, message):
+        self.wfile.write((json.dumps(message, default=str) + '\n').encode())
+        self.wfile.flush()
+
+
+class ShellSageDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Resident server keeping one ModelManager, its clients and caches warm"""
+    daemon_threads = True
+
+    def __init__(self, path=None):
+        from .model_catalog import refresh_in_background_when_stale
+
+        refresh_in_background_when_stale()  # This process outlives the refresh thread
+        self.path = path or socket_path()
+        self._lock = threading.Lock()
+        self._env_signature = None
+        self.manager = None
+        self.llm_handler = None
+        self.generator = None
+        self._reload_if_changed()
+
+        if not os.getenv('SHELLSAGE_SOCKET'):
+            private_dir(os.path.dirname(self.path))
+        self._remove_stale_socket()
+        old_umask = os.umask(0o077)  # Socket is only reachable by its owner
+        try:
+            super().__init__(self.path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)  # Left behind by a daemon that died
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Daemon already running on {self.path}")
+
+    def _reload_if_changed(self):
+        """Rebuild the model stack when the .env file changed since last load"""
+        from .config import config_signature
+        from .model_manager import ModelManager
+        from .llm_handler import DeepSeekLLMHandler
+        from .command_generator import CommandGenerator
+
+        signature = config_signature()
+        with self._lock:
+            if self.manager is not None and signature == self._env_signature:
+                return
+            self.manager = ModelManager()
+            self.llm_handler = DeepSeekLLMHandler(manager=self.manager)
+            self.generator = CommandGenerator(manager=self.manager)
+            self._env_signature = signature
+
+    def dispatch(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {
+                'pid': os.getpid(),
+                'mode': self.manager.mode,
+                'http': self.manager.transport.stats(),
+                'prompt_tokens': self.llm_handler.prompt_tokens_sent
+            }
+        if op == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'pid': os.getpid()}
+
+        self._reload_if_changed()
+        use_cache = request.get('use_cache', True)
+        if op == 'analyze':
+            return self.llm_handler.get_error_solution(request['context'], use_cache=use_cache)
+        if op == 'ask':
+            return self.generator.generate_commands(
+                request['query'], request.get('context') or {}, use_cache=use_cache
+            )
+        if op == 'warm':
+            # In-process models (ctransformers) only stay loaded in a long-lived process
+            return self.manager.preload(request.get('keep_alive'))
+        if op == 'unload':
+            self.manager.unload()
+            return {'model': self.manager.local_model}
+        raise ValueError(f"Unknown daemon operation: {op}")
+
+    def dispatch_stream(self, request):
+        """Generator of partial results for streaming operations"""
+        self._reload_if_changed()
+        op = request.get('op')
+        use_cache = request.get('use_cache', True)
+        if op == 'analyze':
+            return self.llm_handler.stream_error_solution(request['context'], use_cache=use_cache)
+        if op == 'ask':
+            return self.generator.stream_commands(
+                request['query'], request.get('context') or {}, use_cache=use_cache
+            )
+        raise ValueError(f"Operation cannot stream: {op}")
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,26 +1,68 @@
 import subprocess
 import sys
 import os
+import queue
 import re
-import yaml
-import click
+import sqlite3
+import threading
+import time
 from collections import deque
-from .llm_handler import DeepSeekLLMHandler
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from rich.syntax import Syntax
-from rich.columns import Columns
-from rich.rule import Rule
-from rich.markdown import Markdown
-from rich.console import Group
+from .history_store import HistoryStore, session_id
+from .profiling import span
+from .response_parser import ANALYSIS_SECTIONS, parse, strip_code
+
+# Deadline (seconds) for each context probe, measured from the moment the
+# probes are started. Probes that miss it are left out of the prompt.
+PROBE_TIMEOUTS = {
+    'env_vars': 0.5,
+    'process_tree': 1.0,
+    'file_context': 1.0,
+    'network_state': 1.0,
+    'command_history': 2.0,
+    'specialized': 2.0
+}
+
+# Overall latency budget for context collection (SHELLSAGE_CONTEXT_BUDGET)
+CONTEXT_BUDGET = 2.0
+
+# Characters of output kept per recorded command
+OUTPUT_TAIL_CHARS = 200
 
 class ErrorInterceptor:
-    def __init__(self):
-        self.llm_handler = DeepSeekLLMHandler()
+    def __init__(self, use_cache=True):
+        self._llm_handler = None
+        self.use_cache = use_cache
         self.command_history = deque(maxlen=20)  # Increased history depth
+        # Exit code, duration and output tail recorded when a command ran
+        self.command_records = {}
         self.last_command = ""
         self.context_cache = {}
+        self.session_id = session_id()
+        self.history_store = None
+        self._load_history()
+
+    def _load_history(self):
+        """Seed the session history from the persistent store"""
+        try:
+            self.history_store = HistoryStore()
+            entries = self.history_store.recent(session=self.session_id, limit=self.command_history.maxlen)
+        except (sqlite3.Error, OSError):
+            return  # History is an enhancement; never fail because of it
+        for entry in entries:
+            self.command_history.append(entry['command'])
+            self.command_records[entry['command']] = {
+                'exit_code': entry['exit_code'],
+                'duration': entry['duration'],
+                'output': entry['output'] or ''
+            }
+
+    @property
+    def llm_handler(self):
+        """Create the LLM handler (and its provider client) on first use only"""
+        if self._llm_handler is None:
+            from .llm_handler import DeepSeekLLMHandler
+            self._llm_handler = DeepSeekLLMHandler()
+        return self._llm_handler
 
     def run_command(self, command):
         """Execute command with error interception"""
@@ -32,6 +74,7 @@ class ErrorInterceptor:
                 self.command_history.append(full_cmd)
             
             # Execute with live terminal interaction
+            started = time.monotonic()
             result = subprocess.run(
                 full_cmd,
                 shell=True,
@@ -40,6 +83,12 @@ class ErrorInterceptor:
                 capture_output=True,
                 text=True
             )
+            self._record_command(
+                full_cmd,
+                result.returncode,
+                time.monotonic() - started,
+                (result.stdout or '') + (result.stderr or '')
+            )
             
             if result.returncode != 0:
                 self.context_cache = self._get_additional_context()  # Cache context
@@ -51,50 +100,169 @@ class ErrorInterceptor:
             print(f"\n\033[91mExecution Error: {e}\033[0m")
             sys.exit(1)
 
-    def auto_analyze(self, command, exit_code):
+    def auto_analyze(self, command, exit_code, stderr_file=None, rerun=False, started_at=None):
         """Automatically analyze failed commands from shell hook"""
+        from .capture import read_captured_stderr
+
         self.last_command = command
         self.command_history.append(command)
+        error_text = read_captured_stderr(stderr_file) if stderr_file else ''
+        # Re-running can have side effects, so it is only an explicit fallback
+        if not error_text and (rerun or os.getenv('SHELLSAGE_RERUN_FAILED')):
+            error_text = self._get_native_error(command)
+        duration = time.time() - started_at if started_at else None
+        self._record_command(command, exit_code, duration, error_text)
         result = subprocess.CompletedProcess(
             args=command,
             returncode=exit_code,
             stdout='',
-            stderr=self._get_native_error(command)
+            stderr=error_text
         )
         self._handle_error(result, self.context_cache)
 
+    def _record_command(self, command, exit_code, duration, output):
+        """Remember how a command ended so context building never re-runs it"""
+        output = output.strip()
+        if len(output) > OUTPUT_TAIL_CHARS:
+            output = "..." + output[-OUTPUT_TAIL_CHARS:]
+        record = {
+            'exit_code': exit_code,
+            'duration': round(duration, 3) if duration is not None else None,
+            'output': output
+        }
+        self.command_records[command] = record
+        if self.history_store is not None:
+            try:
+                self.history_store.append(self.session_id, command, cwd=os.getcwd(), **record)
+            except (sqlite3.Error, OSError):
+                pass
+
     def _handle_error(self, result, context):
         """Process and analyze command errors"""
-        # Get relevant files from command history
-        relevant_files = self._get_relevant_files_from_history()
+        with span('handle_error', exit_code=result.returncode):
+            # Get relevant files from command history
+            with span('context.relevant_files'):
+                relevant_files = self._get_relevant_files_from_history()
+            with span('context.error_output'):
+                error_output = self._get_full_error_output(result)
         
-        error_context = {
-            'command': self.last_command,
-            'error_output': self._get_full_error_output(result),
-            'cwd': os.getcwd(),
-            'exit_code': result.returncode,
-            'history': list(self.command_history),
-            'relevant_files': relevant_files,
-            **context
-        }
-
-        # Enhanced context for file operations
-        parts = self.last_command.split()
-        if len(parts) > 0:
-            base_cmd = parts[0]
-            error_context['man_excerpt'] = self._get_man_page(base_cmd)
-
-        if os.getenv('SHELLSAGE_DEBUG'):
-            print("\n\033[90m[DEBUG] Error Context:")
-            print(yaml.dump(error_context, allow_unicode=True) + "\033[0m")
-
-        print("\n\033[90m🔎 Analyzing error...\033[0m")
-        solution = self.llm_handler.get_error_solution(error_context)
+            error_context = {
+                'command': self.last_command,
+                'error_output': error_output,
+                'cwd': os.getcwd(),
+                'exit_code': result.returncode,
+                'history': list(self.command_history),
+                'relevant_files': relevant_files,
+                **context
+            }
 
-        if solution:
-            self._show_analysis(solution, error_context)
-        else:
-            print("\n\033[91mError: Could not get analysis\033[0m")
+            # Enhanced context for file operations
+            parts = self.last_command.split()
+            if len(parts) > 0:
+                base_cmd = parts[0]
+                with span('context.man_page', command=base_cmd):
+                    error_context['man_excerpt'] = self._get_man_page(base_cmd)
+
+            if os.getenv('SHELLSAGE_DEBUG'):
+                import yaml
+                print("\n\033[90m[DEBUG] Error Context:")
+                print(yaml.dump(error_context, allow_unicode=True) + "\033[0m")
+
+            print("\n\033[90m🔎 Analyzing error...\033[0m")
+            if self._should_stream():
+                with span('analysis', streaming=True):
+                    solution = self._stream_analysis(error_context)
+            else:
+                with span('analysis', streaming=False):
+                    solution = self._get_solution(error_context)
+                if solution:
+                    with span('render'):
+                        self._show_analysis(solution, error_context)
+
+            if not solution:
+                print("\n\033[91mError: Could not get analysis\033[0m")
+
+    def _should_stream(self):
+        """Stream to terminals unless SHELLSAGE_STREAM=0"""
+        return sys.stdout.isatty() and os.getenv('SHELLSAGE_STREAM', '1') != '0'
+
+    def _get_solution(self, error_context):
+        """Complete solution for an error (see _iter_solution)"""
+        solution = None
+        for solution in self._iter_solution(error_context, stream=False):
+            pass
+        return solution
+
+    def _iter_solution(self, error_context, stream):
+        """Answer from the knowledge base, a running daemon, or in-process.
+
+        Yields partial solutions while streaming; the last value is final.
+        """
+        from .fingerprint import command_base, error_template, fingerprint
+        from .knowledge_base import KnowledgeBase
+        from .daemon import request_daemon, stream_daemon
+
+        error_fingerprint = fingerprint(error_context['command'], error_context['error_output'])
+        template = error_template(error_context['error_output'])
+        knowledge_base = None
+        # Without error text the fingerprint is just the tool: one accepted fix
+        # would answer every silent failure of it (every `grep` that exits 1)
+        if template:
+            try:
+                knowledge_base = KnowledgeBase()
+            except (sqlite3.Error, OSError):
+                pass
+
+        if knowledge_base is not None and self.use_cache:
+            known = knowledge_base.lookup(error_fingerprint)
+            if known:
+                error_context['knowledge_base_match'] = error_fingerprint
+                yield known
+                return
+
+        solution = None
+        try:
+            if stream:
+                partials = stream_daemon('analyze', context=error_context, use_cache=self.use_cache)
+                if partials is not None:
+                    for solution in partials:
+                        yield solution
+            else:
+                solution = request_daemon('analyze', context=error_context, use_cache=self.use_cache)
+        except Exception as e:
+            yield f"Error: {str(e)}"
+            return
+        if solution is None:
+            for solution in self.llm_handler.stream_error_solution(
+                error_context, use_cache=self.use_cache, stream=stream
+            ):
+                if stream:
+                    yield solution
+
+        if knowledge_base is not None and solution and not solution.startswith('Error:'):
+            knowledge_base.remember_pending(
+                self.session_id,
+                error_fingerprint,
+                command_base(error_context['command']),
+                template,
+                solution
+            )
+        if not stream:
+            yield solution
+
+    def _stream_analysis(self, error_context):
+        """Render the analysis progressively as the model produces it"""
+        from rich.console import Console
+        from rich.live import Live
+
+        solution = None
+        with Live(console=Console(), refresh_per_second=10) as live:
+            for solution in self._iter_solution(error_context, stream=True):
+                if solution:
+                    live.update(self._render_analysis(solution, error_context, streaming=True))
+            if solution:
+                live.update(self._render_analysis(solution, error_context))
+        return solution
 
     def _get_relevant_files_from_history(self):
         """Extract recently referenced files from command history"""
@@ -127,30 +295,8 @@ class ErrorInterceptor:
                 if result.returncode == 0 and not result.stdout.strip():
                     return "Git status: No changes to commit (working directory clean)"
                 
-            result = subprocess.run(
-                f'man {command} 2>/dev/null | col -b',
-                shell=True,
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode == 0:
-                content = result.stdout
-                
-                # Extract relevant sections
-                sections = []
-                current_section = None
-                for line in content.split('\n'):
-                    if line.upper() in ['NAME', 'SYNOPSIS', 'DESCRIPTION']:
-                        current_section = line
-                        sections.append(line)
-                    elif current_section and line.startswith(' '):
-                        sections.append(line.strip())
-                    if len(sections) > 10:  # Limit size
-                        break
-                        
-                return '\n'.join(sections)
-            return "No manual entry available"
+            from .man_pages import ManPageCache
+            return ManPageCache().get_excerpt(command)
         except Exception:
             return "Error retrieving manual page"
 
@@ -187,28 +333,37 @@ class ErrorInterceptor:
 
     def _show_analysis(self, solution, context):
         """Display analysis with thinking process"""
-        console = Console()
-
-        # Extract thinking blocks first
-        thoughts = []
-        remaining = solution
-        while '<think>' in remaining and '</think>' in remaining:
-            think_start = remaining.find('<think>') + len('<think>')
-            think_end = remaining.find('</think>')
-            if think_start > -1 and think_end > -1:
-                thoughts.append(remaining[think_start:think_end].strip())
-                remaining = remaining[think_end + len('</think>'):]
+        from rich.console import Console
+
+        Console().print(self._render_analysis(solution, context))
+
+    def _render_analysis(self, solution, context, streaming=False):
+        """Build the analysis display; `streaming` renders a partial solution"""
+        from rich.console import Group
+        from rich.panel import Panel
+        from rich.syntax import Syntax
+        from rich.columns import Columns
+        from rich.markdown import Markdown
+
+        blocks = []
+
+        parsed = parse(solution, ANALYSIS_SECTIONS)
+        thoughts = parsed.thoughts
+        # A streamed solution ends with a bare marker while the model reasons
+        still_thinking = parsed.thinking
         
-        console.print("\n[bold cyan]Error Analysis[/bold cyan]")
+        blocks.append("\n[bold cyan]Error Analysis[/bold cyan]")
     
         # Display thinking process if any
         if thoughts:
-            console.print(Panel(
+            blocks.append(Panel(
                 "\n".join(f"[dim]› {thought}[/dim]" for thought in thoughts),
                 title="[gold1]Cognitive Process[/]",
                 border_style="gold1",
                 padding=(0, 2)
             ))
+        if still_thinking:
+            blocks.append("[dim gold1]› thinking...[/]")
         
         # Context information
         context_content = []
@@ -238,26 +393,20 @@ class ErrorInterceptor:
             )
         
         if context_content:
-            console.print(Columns(context_content, equal=True, expand=False))
+            blocks.append(Columns(context_content, equal=True, expand=False))
         
         # Error Components
-        components = {
-            'cause': re.search(r'🔍 Root Cause: (.+?)(?=\n🛠️|\n📚|\n⚠️|\n🔒|$)', remaining, re.DOTALL),
-            'fix': re.search(r'🛠️ Fix: (`{1,3}(.*?)`{1,3}|([^\n]+))', remaining, re.DOTALL),
-            'explanation': re.search(r'📚 Technical Explanation: (.+?)(?=\n⚠️|\n🔒|$)', remaining, re.DOTALL),
-            'risk': re.search(r'⚠️ Potential Risks: (.+?)(?=\n🔒|$)', remaining, re.DOTALL),
-            'prevention': re.search(r'🔒 Prevention Tip: (.+?)(?=\n|$)', remaining, re.DOTALL)
-        }
+        components = parsed.sections
     
         # Main Analysis Content
         analysis_blocks = []
-        if components['cause']:
-            analysis_blocks.append(Markdown(f"**Root Cause**\n{components['cause'].group(1)}"))
-        if components['explanation']:
-            analysis_blocks.append(Markdown(f"**Technical Explanation**\n{components['explanation'].group(1)}"))
+        if components.get('cause'):
+            analysis_blocks.append(Markdown(f"**Root Cause**\n{components['cause']}"))
+        if components.get('explanation'):
+            analysis_blocks.append(Markdown(f"**Technical Explanation**\n{components['explanation']}"))
         
         if analysis_blocks:
-            console.print(Panel(
+            blocks.append(Panel(
                 Group(*analysis_blocks),
                 title="[cyan]Diagnosis[/]",
                 border_style="cyan",
@@ -265,9 +414,9 @@ class ErrorInterceptor:
             ))
         
         # Recommended Fix
-        if components['fix']:
-            fix_command = components['fix'].group(1).strip('`')
-            console.print(Panel(
+        if components.get('fix'):
+            fix_command = strip_code(components['fix'])
+            blocks.append(Panel(
                 Syntax(fix_command, "bash", theme="ansi_light", line_numbers=False),
                 title="[bold bright_green]⚡ RECOMMENDED FIX[/]",
                 border_style="bright_green",
@@ -277,18 +426,27 @@ class ErrorInterceptor:
         
         # Additional Information
         info_blocks = []
-        if components['risk']:
-            info_blocks.append(Markdown(f"**Potential Risks**\n{components['risk'].group(1)}"))
-        if components['prevention']:
-            info_blocks.append(Markdown(f"**Prevention Tip**\n{components['prevention'].group(1)}"))
+        if components.get('risks'):
+            info_blocks.append(Markdown(f"**Potential Risks**\n{components['risks']}"))
+        if components.get('prevention'):
+            info_blocks.append(Markdown(f"**Prevention Tip**\n{components['prevention']}"))
         
         if info_blocks:
-            console.print(Panel(
+            blocks.append(Panel(
                 Group(*info_blocks),
                 title="[yellow]Additional Information[/]",
                 border_style="yellow",
                 padding=(0, 2)
             ))
+
+        # Footer only once the answer is complete
+        if not streaming:
+            if context.get('knowledge_base_match'):
+                blocks.append(f"[dim]📚 Answered from your knowledge base ({context['knowledge_base_match']})[/dim]")
+            elif components.get('fix'):
+                blocks.append("[dim]Fixed it? Run [bold]shellsage kb accept[/bold] to reuse this fix next time.[/dim]")
+
+        return Group(*blocks)
     
     def _print_component(self, match, color, label):
         """Enhanced component display"""
@@ -321,20 +479,66 @@ class ErrorInterceptor:
             return "Command execution failed"
 
     def _get_additional_context(self):
-        """Enhanced context gathering for error analysis"""
-        context = {
-            'env_vars': self._get_relevant_env_vars(),
-            'process_tree': self._get_process_tree(),
-            'file_context': self._get_file_context(),
-            'network_state': self._get_network_state()
+        """Enhanced context gathering for error analysis.
+
+        Probes run concurrently, each bounded by its PROBE_TIMEOUTS deadline
+        and all of them by the overall CONTEXT_BUDGET.
+        """
+        probes = {
+            'env_vars': self._get_relevant_env_vars,
+            'process_tree': self._get_process_tree,
+            'file_context': self._get_file_context,
+            'network_state': self._get_network_state,
+            'command_history': self._enhance_command_history,
+            'specialized': self._get_specialized_context
         }
+        budget = float(os.getenv('SHELLSAGE_CONTEXT_BUDGET', CONTEXT_BUDGET))
 
-        context['command_history'] = self._enhance_command_history()
+        context = {}
+        dropped = []
+        start = time.monotonic()
+        deadlines = {name: start + min(PROBE_TIMEOUTS[name], budget) for name in probes}
+        results = queue.Queue()
 
-        context.update(self._get_specialized_context())
+        def run(name, probe):
+            try:
+                results.put((name, self._run_probe(name, probe), None))
+            except Exception as e:
+                results.put((name, None, e))
+
+        with span('context.probes', budget=budget) as probes_span:
+            # Daemon threads: a probe stuck past its deadline (hung mount, slow
+            # git) is abandoned and cannot hold up interpreter exit
+            for name, probe in probes.items():
+                threading.Thread(target=run, args=(name, probe), name=f'shellsage-probe-{name}', daemon=True).start()
+            pending = set(probes)
+            while pending:
+                timeout = max(0, min(deadlines[name] for name in pending) - time.monotonic())
+                try:
+                    name, result, error = results.get(timeout=timeout)
+                except queue.Empty:
+                    expired = [name for name in probes if name in pending and deadlines[name] <= time.monotonic()]
+                    dropped.extend(expired)  # Timed out: drop it from the prompt
+                    pending.difference_update(expired)
+                    continue
+                if name not in pending:
+                    continue  # Arrived after its deadline
+                pending.discard(name)
+                if error is not None:
+                    dropped.append(name)
+                elif name == 'specialized':
+                    context.update(result)
+                else:
+                    context[name] = result
+            probes_span.set(dropped=dropped)
 
         return context
 
+    @staticmethod
+    def _run_probe(name, probe):
+        with span(f'context.probe.{name}'):
+            return probe()
+
     def _get_relevant_env_vars(self):
         return {
             'PATH': os.getenv('PATH', ''),
@@ -350,7 +554,8 @@ class ErrorInterceptor:
             ps_output = subprocess.check_output(
                 ['ps', '-ef', '--forest'], 
                 stderr=subprocess.DEVNULL,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUTS['process_tree']
             ).strip()
             return ps_output.split('\n')[-10:]  # Last 10 processes
         except Exception:
@@ -358,39 +563,16 @@ class ErrorInterceptor:
 
     
     def _get_file_context(self):
-        cwd = os.getcwd()
-        context = {
-            'files': [f for f in os.listdir(cwd) if os.path.isfile(f)][:10],
-            'dirs': [d for d in os.listdir(cwd) if os.path.isdir(d)][:5]
-        }
-
-        
-        cmd_parts = self.last_command.split()
-        if not cmd_parts:
-            return context
-
-       
-        potential_files = [p for p in cmd_parts if os.path.exists(p) and os.path.isfile(p)]
-
-      
-        file_contents = {}
-        for f in potential_files[:2]:  # Limit to 2 most relevant files
-            try:
-                with open(f, 'r') as file:
-                    content = "".join(file.readlines()[:20])
-                    file_contents[f] = content
-            except Exception:
-                file_contents[f] = "Unable to read file content"
-
-        context['file_contents'] = file_contents
-        return context
+        from .file_context import collect_file_context
+        return collect_file_context(self.last_command, os.getcwd())
 
     def _get_network_state(self):
         try:
             return subprocess.check_output(
                 ['ss', '-tulpn'],
                 stderr=subprocess.DEVNULL,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUTS['network_state']
             ).strip().split('\n')[:5]
         except Exception:
             return []
@@ -401,13 +583,15 @@ class ErrorInterceptor:
                 'git status --porcelain',
                 shell=True,
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUTS['specialized']
             )
             git_remotes = subprocess.run(
                 'git remote -v',
                 shell=True,
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUTS['specialized']
             ).stdout
             return {
                 'git_status': git_status.stdout,
@@ -418,24 +602,12 @@ class ErrorInterceptor:
         
     
     def _enhance_command_history(self):
-        """Track both commands and their outputs"""
-        history_dict = {}
-        for cmd in self.command_history:
-            if cmd not in history_dict:
-                try:
-                    result = subprocess.run(
-                        cmd,
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=2  # Set timeout to avoid hanging
-                    )
-                    output = result.stdout[:200] + ("..." if len(result.stdout) > 200 else "")
-                    history_dict[cmd] = output
-                except Exception:
-                    history_dict[cmd] = "Error capturing output"
-
-        return history_dict
+        """Track both commands and their outputs, as recorded when they ran"""
+        return {
+            cmd: self.command_records[cmd]
+            for cmd in self.command_history
+            if cmd in self.command_records
+        }
     
     def _get_specialized_context(self):
         """Get command-specific context based on command type"""
@@ -471,7 +643,8 @@ class ErrorInterceptor:
                 'docker ps --format "{{.Names}} ({{.Status}})"',
                 shell=True,
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUTS['specialized']
             ).stdout.strip()
 
             compose_files = []
@@ -494,7 +667,8 @@ class ErrorInterceptor:
                     'apt list --upgradable 2>/dev/null | head -n 5',
                     shell=True,
                     capture_output=True,
-                    text=True
+                    text=True,
+                    timeout=PROBE_TIMEOUTS['specialized']
                 ).stdout.strip()
                 return {'available_updates': updates.split('\n') if updates else []}
             return {}
@@ -510,7 +684,8 @@ class ErrorInterceptor:
                     'systemctl list-units --state=failed --no-legend | head -n 3',
                     shell=True,
                     capture_output=True,
-                    text=True
+                    text=True,
+                    timeout=PROBE_TIMEOUTS['specialized']
                 ).stdout.strip()
 
                 return {'failed_services': failed.split('\n') if failed else []}
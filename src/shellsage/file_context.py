@@ -0,0 +1,187 @@
+import bisect
+import codecs
+import os
+import re
+import stat
+
+# Files an error output refers to, for the prompt's "Referenced Files". The
+# output can be a multi-megabyte compiler log or traceback, so only a
+# bounded window of it is scanned (its end, where the failure is reported),
+# candidates are deduplicated and ranked by how close they are to error
+# lines before anything touches the filesystem, and each distinct path is
+# stat'ed at most once, with a single os.stat rather than exists + isfile.
+#
+# The working-directory listing and the excerpts of files named in the
+# failed command are bounded the same way: one capped os.scandir pass, and
+# at most HEAD_BYTES read from each file, so a `cat huge.log | ...` failure
+# never reads gigabytes. Binary files are detected and skipped.
+
+SCAN_CHARS = 64 * 1024    # Tail of the error output searched for paths
+MAX_CANDIDATES = 64       # Distinct candidates stat'ed, nearest to an error first
+MAX_REFERENCED = 5        # Files listed in the prompt
+
+MAX_SCAN_ENTRIES = 1000   # Directory entries looked at for the listing
+MAX_LISTED_FILES = 10
+MAX_LISTED_DIRS = 5
+MAX_EXCERPTS = 2          # Files from the command whose head is shown
+HEAD_BYTES = 4096
+HEAD_LINES = 20
+
+# 'quoted', "quoted" (no line breaks) or a bare token with an extension:
+# src/main.c:12:5, ./setup.py, /etc/hosts.conf
+_CANDIDATE = re.compile(r"'([^'\n]{1,255})'|\"([^\"\n]{1,255})\"|(?<![\w/.~-])([\w/.~-]{1,255}\.\w+)")
+_ERROR_LINE = re.compile(
+    r'error|exception|traceback|fatal|failed|denied|not found|no such file|cannot|undefined',
+    re.IGNORECASE
+)
+
+
+def _window(text, limit):
+    """The last `limit` characters of text, starting at a line boundary"""
+    if len(text) <= limit:
+        return text
+    window = text[-limit:]
+    newline = window.find('\n')
+    return window[newline + 1:] if 0 <= newline else window
+
+
+def _ranked_candidates(text):
+    """Distinct path-like strings, nearest to an error line first (later ones on ties)"""
+    lines = text.split('\n')
+    error_lines = [number for number, line in enumerate(lines) if _ERROR_LINE.search(line)]
+    best = {}
+    for number, line in enumerate(lines):
+        if not any(char in line for char in './\'"'):
+            continue
+        for match in _CANDIDATE.finditer(line):
+            candidate = (match.group(1) or match.group(2) or match.group(3)).strip()
+            if not candidate:
+                continue
+            if error_lines:
+                index = bisect.bisect_left(error_lines, number)
+                distance = min(
+                    abs(error_lines[i] - number) for i in (index - 1, index) if 0 <= i < len(error_lines)
+                )
+            else:
+                distance = 0
+            rank = (distance, -number)
+            if candidate not in best or rank < best[candidate]:
+                best[candidate] = rank
+    return sorted(best, key=best.get)
+
+
+def is_file(path, cwd=None, stats=None):
+    """Whether path (relative to cwd) is a regular file; `stats` caches answers per call site"""
+    resolved = os.path.join(cwd or os.getcwd(), os.path.expanduser(path))
+    if stats is not None and resolved in stats:
+        return stats[resolved]
+    try:
+        result = stat.S_ISREG(os.stat(resolved).st_mode)
+    except (OSError, ValueError):  # Missing, unreadable, or not a valid path
+        result = False
+    if stats is not None:
+        stats[resolved] = result
+    return result
+
+
+def referenced_files(error_output, cwd=None, stats=None, limit=MAX_REFERENCED):
+    """Existing files mentioned in an error output, most relevant first"""
+    if not error_output:
+        return []
+    cwd = cwd or os.getcwd()
+    stats = {} if stats is None else stats
+    found = []
+    for candidate in _ranked_candidates(_window(error_output, SCAN_CHARS))[:MAX_CANDIDATES]:
+        if is_file(candidate, cwd, stats):
+            found.append(candidate)
+            if len(found) >= limit:
+                break
+    return found
+
+
+def list_directory(cwd=None):
+    """First files and directories of cwd, from a single capped scandir pass"""
+    files, dirs = [], []
+    try:
+        with os.scandir(cwd or os.getcwd()) as entries:
+            for count, entry in enumerate(entries):
+                if count >= MAX_SCAN_ENTRIES or (len(files) >= MAX_LISTED_FILES and len(dirs) >= MAX_LISTED_DIRS):
+                    break
+                try:
+                    if entry.is_file():
+                        if len(files) < MAX_LISTED_FILES:
+                            files.append(entry.name)
+                    elif entry.is_dir():
+                        if len(dirs) < MAX_LISTED_DIRS:
+                            dirs.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, dirs
+
+
+def _looks_binary(data):
+    return b'\0' in data
+
+
+def _decode(data):
+    """Text of a file head, or None when it is not text
+
+    UTF-8 (with or without BOM) and BOM-marked UTF-16 are decoded as such; a
+    multi-byte character cut off by the read limit is dropped. Other bytes
+    are read as Latin-1 when they contain no control characters.
+    """
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return codecs.getincrementaldecoder('utf-16')(errors='replace').decode(data)
+    if _looks_binary(data):
+        return None
+    try:
+        return codecs.getincrementaldecoder('utf-8-sig')().decode(data)
+    except UnicodeDecodeError:
+        pass
+    if any(byte < 32 and byte not in b'\t\n\r\f\x1b' for byte in data):
+        return None
+    return data.decode('latin-1')
+
+
+def read_head(path, max_bytes=HEAD_BYTES, max_lines=HEAD_LINES):
+    """First lines of a text file within max_bytes; None for binary files"""
+    with open(path, 'rb') as f:
+        data = f.read(max_bytes)
+    text = _decode(data)
+    if text is None:
+        return None
+    lines = text.splitlines(keepends=True)
+    if len(data) == max_bytes and len(lines) > 1 and not lines[-1].endswith(('\n', '\r')):
+        lines.pop()  # Partial last line
+    return ''.join(lines[:max_lines])
+
+
+def collect_file_context(command, cwd=None, stats=None):
+    """Working-directory listing plus the heads of files named in command"""
+    cwd = cwd or os.getcwd()
+    stats = {} if stats is None else stats
+    files, dirs = list_directory(cwd)
+    context = {'files': files, 'dirs': dirs}
+
+    cmd_parts = (command or '').split()
+    if not cmd_parts:
+        return context
+
+    file_contents = {}
+    for part in dict.fromkeys(cmd_parts):
+        if len(file_contents) >= MAX_EXCERPTS:
+            break
+        if not is_file(part, cwd, stats):
+            continue
+        try:
+            content = read_head(os.path.join(cwd, os.path.expanduser(part)))
+        except OSError:
+            file_contents[part] = "Unable to read file content"
+            continue
+        if content is not None:  # Binary files are skipped
+            file_contents[part] = content
+
+    context['file_contents'] = file_contents
+    return context
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import re
+
+# Two failures share a fingerprint when they are the same error from the same
+# tool, regardless of the paths, PIDs, ports, line numbers or addresses that
+# differ between occurrences. `No such file or directory: '/tmp/build-8123/x.o'`
+# and the same message for `/tmp/build-977/y.o` map to one template.
+
+TEMPLATE_MAX_LINES = 12
+TEMPLATE_MAX_CHARS = 1500
+
+# Tools whose first argument selects a different program (`git push` fails
+# differently from `git clone`)
+SUBCOMMAND_TOOLS = {
+    'apt', 'apt-get', 'brew', 'cargo', 'docker', 'docker-compose', 'dnf', 'git',
+    'go', 'helm', 'kubectl', 'npm', 'pip', 'pip3', 'pnpm', 'poetry', 'systemctl',
+    'terraform', 'yarn', 'yum'
+}
+
+# Applied in order: specific shapes first so their digits are not masked as <N>
+_MASKS = [
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.I), '<UUID>'),
+    (re.compile(r'\b0x[0-9a-f]+\b', re.I), '<HEX>'),
+    (re.compile(r'\b[0-9a-f]{12,}\b', re.I), '<HEX>'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?'), '<TIME>'),
+    (re.compile(r'\b\d{1,2}:\d{2}:\d{2}\b'), '<TIME>'),
+    (re.compile(r'\b\d{1,3}(\.\d{1,3}){3}\b'), '<IP>'),
+    (re.compile(r'(?<!\w)(?:~|\.{1,2})?(?:/[\w.@+-]+)+/?'), '<PATH>'),
+    (re.compile(r'\b[\w-]+(\.[\w-]+)*\.(py|js|ts|go|rs|c|cc|cpp|h|hpp|java|rb|o|so|sh|json|ya?ml|toml|txt|log)\b'), '<FILE>'),
+    (re.compile(r'\d+'), '<N>'),
+]
+_WHITESPACE = re.compile(r'[ \t]+')
+
+
+def command_base(command):
+    """The program (plus subcommand for multiplexer tools) a command runs"""
+    parts = (command or '').split()
+    # Skip env assignments and sudo so `sudo apt install x` groups with `apt install y`
+    while parts and ('=' in parts[0] or parts[0] == 'sudo'):
+        parts = parts[1:]
+    if not parts:
+        return ''
+    base = os.path.basename(parts[0])
+    if base in SUBCOMMAND_TOOLS:
+        sub = next((p for p in parts[1:] if not p.startswith('-')), None)
+        if sub:
+            return f"{base} {sub}"
+    return base
+
+
+def error_template(error_output):
+    """Error text with volatile tokens masked and whitespace normalized"""
+    lines = []
+    for line in (error_output or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        for pattern, placeholder in _MASKS:
+            line = pattern.sub(placeholder, line)
+        lines.append(_WHITESPACE.sub(' ', line))
+        if len(lines) >= TEMPLATE_MAX_LINES:
+            break
+    return '\n'.join(lines)[:TEMPLATE_MAX_CHARS]
+
+
+def fingerprint(command, error_output):
+    """Stable identifier for a (command, error) pair"""
+    template = error_template(error_output)
+    digest = hashlib.sha1(f"{command_base(command)}\n{template}".encode()).hexdigest()
+    return digest[:16]
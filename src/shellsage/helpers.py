@@ -1,38 +1,42 @@
+import os
 from pathlib import Path
 
+def get_state_dir():
+    """Directory holding ShellSage's persistent data (history, caches)"""
+    base = os.getenv('SHELLSAGE_HOME') or os.path.join(
+        os.getenv('XDG_STATE_HOME') or os.path.expanduser('~/.local/state'),
+        'shellsage'
+    )
+    path = Path(base)
+    # History, spool and caches hold full commands and their output: owner only
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        if path.stat().st_mode & 0o077:
+            path.chmod(0o700)
+    except OSError:
+        pass
+    return path
+
+def distribution_name():
+    """Pretty name of the running distribution, for prompts"""
+    try:
+        with open('/etc/os-release') as f:
+            dist_info = {k.lower(): v.strip('"') for k,v in 
+                        [line.rstrip('\n').split('=', 1) for line in f if '=' in line]}
+        return dist_info.get('pretty_name', 'Linux')
+    except FileNotFoundError:
+        import platform
+        return f"{platform.system()} {platform.release()}"
+
 def update_env_file(provider, key):
     """Update provider key in .env without duplicates"""
-    env_path = Path('.env')
-    
-    if not env_path.exists():
-        env_path.touch()
-        
-    lines = env_path.read_text().splitlines()
-    key_line = f"{provider.upper()}_API_KEY={key}"
-    
-    # Remove existing entries
-    new_lines = [line for line in lines if not line.startswith(f"{provider.upper()}_API_KEY=")]
-    
-    # Add new key at the end
-    new_lines.append(key_line)
-    
-    # Write back to file
-    env_path.write_text("\n".join(new_lines))
+    update_env_variables({f"{provider.upper()}_API_KEY": key})
 
 def update_env_variable(variable, value):
     """Update any .env variable without duplicates"""
-    env_path = Path('.env')
-    
-    if not env_path.exists():
-        env_path.touch()
-        
-    lines = env_path.read_text().splitlines()
-    
-    # Remove existing entries
-    new_lines = [line for line in lines if not line.startswith(f"{variable}=")]
-    
-    # Add new value
-    new_lines.append(f"{variable}={value}")
-    
-    # Write back to file
-    env_path.write_text("\n".join(new_lines))
\ No newline at end of file
+    update_env_variables({variable: value})
+
+def update_env_variables(values):
+    """Write several .env variables at once (one atomic, locked rewrite)"""
+    from .config import update_env
+    return update_env(values)
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import time
+from .helpers import get_state_dir
+
+# Command history shared by every ShellSage process. Entries live in a SQLite
+# database (WAL mode, so readers never block the writer) indexed by shell
+# session and working directory. The shell hook cannot afford to start Python
+# for successful commands, so it appends a tab-separated line to a spool file
+# instead; the spool is folded into the database the next time it is opened.
+
+MAX_ENTRIES = 5000      # Rows kept after compaction
+COMPACT_EVERY = 500     # Compaction is attempted once per this many inserts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    cwd TEXT,
+    command TEXT NOT NULL,
+    exit_code INTEGER,
+    duration REAL,
+    output TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_session ON history (session, id);
+CREATE INDEX IF NOT EXISTS history_cwd ON history (cwd, id);
+"""
+
+
+def session_id():
+    """Identify the interactive shell this process belongs to"""
+    return os.getenv('SHELLSAGE_SESSION') or str(os.getppid())
+
+
+class HistoryStore:
+    def __init__(self, path=None):
+        state_dir = get_state_dir()
+        self.path = path or state_dir / 'history.db'
+        self.spool_path = state_dir / 'history.spool'
+        self.conn = sqlite3.connect(str(self.path), timeout=2)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._ingest_spool()
+
+    def append(self, session, command, exit_code=None, duration=None, output=None, cwd=None, created=None):
+        """Add one command to the history"""
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO history (session, cwd, command, exit_code, duration, output, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (session, cwd, command, exit_code, duration, output, created or time.time())
+            )
+        if cursor.lastrowid % COMPACT_EVERY == 0:
+            self.compact()
+
+    def recent(self, session=None, cwd=None, limit=20):
+        """Last `limit` entries, oldest first, optionally for one session/cwd"""
+        clauses, params = [], []
+        if session is not None:
+            clauses.append('session = ?')
+            params.append(session)
+        if cwd is not None:
+            clauses.append('cwd = ?')
+            params.append(cwd)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.conn.execute(
+            f'SELECT command, exit_code, duration, output, cwd, created FROM history {where} '
+            'ORDER BY id DESC LIMIT ?',
+            (*params, limit)
+        ).fetchall()
+        return [
+            {
+                'command': command,
+                'exit_code': exit_code,
+                'duration': duration,
+                'output': output,
+                'cwd': cwd,
+                'created': created
+            }
+            for command, exit_code, duration, output, cwd, created in reversed(rows)
+        ]
+
+    def compact(self):
+        """Drop everything but the newest MAX_ENTRIES rows"""
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?',
+                (MAX_ENTRIES,)
+            )
+
+    def _ingest_spool(self):
+        """Move commands recorded by the shell hook into the database"""
+        # Renaming first means concurrent processes never ingest a line twice
+        claimed = self.spool_path.with_name(f"{self.spool_path.name}.{os.getpid()}")
+        try:
+            os.rename(self.spool_path, claimed)
+        except FileNotFoundError:
+            return
+
+        rows = []
+        try:
+            with open(claimed, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    # start, end, session, exit code, cwd, command
+                    fields = line.rstrip('\n').split('\t', 5)
+                    if len(fields) != 6 or not fields[5]:
+                        continue
+                    started, ended, session, exit_code, cwd, command = fields
+                    if not exit_code.isdigit():
+                        continue
+                    try:
+                        ended = float(ended.replace(',', '.'))
+                        duration = round(ended - float(started.replace(',', '.')), 3)
+                    except ValueError:
+                        ended, duration = time.time(), None
+                    rows.append((session, cwd, command, int(exit_code), duration, None, ended))
+        finally:
+            os.unlink(claimed)
+
+        if rows:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO history (session, cwd, command, exit_code, duration, output, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+            self.compact()
+
+    def close(self):
+        self.conn.close()
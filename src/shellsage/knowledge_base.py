@@ -0,0 +1,101 @@
+import sqlite3
+import time
+from .helpers import get_state_dir
+
+# Local knowledge base of fixes the user confirmed, indexed by error
+# fingerprint. Every LLM analysis is kept as the session's "pending" answer;
+# `shellsage kb accept` promotes it, after which the same failure (modulo
+# volatile tokens) is answered from here without calling a model.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fixes (
+    fingerprint TEXT PRIMARY KEY,
+    command_base TEXT,
+    template TEXT,
+    solution TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+    session TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    command_base TEXT,
+    template TEXT,
+    solution TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+class KnowledgeBase:
+    def __init__(self, path=None):
+        self.path = path or get_state_dir() / 'knowledge.db'
+        self.conn = sqlite3.connect(str(self.path), timeout=2, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def lookup(self, fingerprint):
+        """Accepted solution for a fingerprint, or None"""
+        row = self.conn.execute(
+            'SELECT solution FROM fixes WHERE fingerprint = ?', (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute('UPDATE fixes SET hits = hits + 1 WHERE fingerprint = ?', (fingerprint,))
+        return row[0]
+
+    def remember_pending(self, session, fingerprint, command_base, template, solution):
+        """Keep the latest analysis of a session until it is accepted"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pending '
+                '(session, fingerprint, command_base, template, solution, created) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (session, fingerprint, command_base, template, solution, time.time())
+            )
+
+    def accept_pending(self, session=None):
+        """Promote a session's pending analysis (latest of any session if None)"""
+        if session is None:
+            query, params = 'SELECT * FROM pending ORDER BY created DESC LIMIT 1', ()
+        else:
+            query, params = 'SELECT * FROM pending WHERE session = ?', (session,)
+        row = self.conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        session, fingerprint, command_base, template, solution, _ = row
+        self.accept(fingerprint, command_base, template, solution)
+        with self.conn:
+            self.conn.execute('DELETE FROM pending WHERE session = ?', (session,))
+        return fingerprint
+
+    def accept(self, fingerprint, command_base, template, solution):
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO fixes (fingerprint, command_base, template, solution, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(fingerprint) DO UPDATE SET solution = excluded.solution, '
+                'updated = excluded.updated',
+                (fingerprint, command_base, template, solution, now, now)
+            )
+
+    def forget(self, fingerprint):
+        with self.conn:
+            cursor = self.conn.execute('DELETE FROM fixes WHERE fingerprint = ?', (fingerprint,))
+        return cursor.rowcount > 0
+
+    def entries(self):
+        """All accepted fixes, most used first"""
+        rows = self.conn.execute(
+            'SELECT fingerprint, command_base, template, hits FROM fixes ORDER BY hits DESC, updated DESC'
+        ).fetchall()
+        return [
+            {'fingerprint': fp, 'command_base': base, 'template': template, 'hits': hits}
+            for fp, base, template, hits in rows
+        ]
+
+    def close(self):
+        self.conn.close()
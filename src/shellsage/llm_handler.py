@@ -1,35 +1,108 @@
-import os
-import re
+from .file_context import referenced_files
 from .model_manager import ModelManager
+from .profiling import span
+from .prompt_budget import PromptBudget
+from .response_cache import ResponseCache, cache_disabled
+from .response_parser import ANALYSIS_SECTIONS, ResponseParser, format_analysis, parse
+
+ANALYSIS_FORMAT = """**Required Analysis Format:**
+<think>
+Step 1: Identify the exact error message and command that failed
+Step 2: Analyze why the command failed (syntax, missing files, permissions, etc.)
+Step 3: Find the correct command or fix based on context
+Step 4: Consider any potential risks
+</think>
+
+Root Cause: <1-line diagnosis>
+Fix: `[executable command]`
+Technical Explanation: <specific system-level reason>
+Potential Risks: <if any>
+Prevention Tip: <actionable advice>"""
 
 class DeepSeekLLMHandler:
-    def __init__(self):
-        self.manager = ModelManager()
+    def __init__(self, manager=None):
+        # Share a ModelManager (and its clients) when the caller already has one
+        self.manager = manager or ModelManager()
+        self._response_cache = None
+        self.last_prompt_usage = None
+        self.prompt_tokens_sent = 0
+
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache()
+        return self._response_cache
     
-    def get_error_solution(self, error_context):
-        prompt = self._build_prompt(error_context)
+    def get_error_solution(self, error_context, use_cache=True):
+        solution = None
+        for solution in self.stream_error_solution(error_context, use_cache=use_cache, stream=False):
+            pass
+        return solution
+
+    def stream_error_solution(self, error_context, use_cache=True, stream=True):
+        """Yield the formatted solution so far each time a response line completes.
+
+        The last value yielded is the complete solution (or an "Error: ..." string).
+        """
+        use_cache = use_cache and not cache_disabled()
+        # Files mentioned in the error that exist, nearest to the error lines first
+        error_files = referenced_files(error_context.get('error_output') or '', error_context.get('cwd'))
+        if use_cache:
+            # The prompt also depends on the directory and the files around the
+            # failure, so another project (or an edited file) is not answered
+            # from the cache
+            cache_key = ResponseCache.make_key(
+                'analysis',
+                self.manager.backend_identity(),
+                command=error_context.get('command'),
+                exit_code=error_context.get('exit_code'),
+                error_output=error_context.get('error_output'),
+                cwd=error_context.get('cwd'),
+                referenced_files=error_files,
+                file_contents=error_context.get('file_context', {}).get('file_contents', {})
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        with span('prompt.build') as prompt_span:
+            prompt = self._build_prompt(error_context, error_files)
+            prompt_span.set(tokens=self.last_prompt_usage['total'] if self.last_prompt_usage else None)
         try:
-            response = self.manager.generate(prompt, max_tokens=1024)
-            return self._format_response(response)
+            parser = ResponseParser(ANALYSIS_SECTIONS)
+            if stream:
+                # Lines are parsed once, as they arrive; only the snapshot is re-rendered
+                chars = 0
+                for chunk in self.manager.generate_stream(prompt, max_tokens=1024, accept=self._is_usable):
+                    chars += len(chunk)
+                    parser.feed(chunk)
+                    if '\n' in chunk:
+                        yield self._format_parsed(parser.result())
+            else:
+                response = self.manager.generate(prompt, max_tokens=1024, accept=self._is_usable)
+                chars = len(response or '')
+                parser.feed(response or '')
+            with span('parse', chars=chars):
+                parser.finish()
+                solution = self._format_parsed(parser.result())
         except Exception as e:
-            return f"Error: {str(e)}"
+            yield f"Error: {str(e)}"
+            return
+
+        if use_cache and solution:
+            self.response_cache.set(cache_key, solution)
+        yield solution
 
     # Update _build_prompt in DeepSeekLLMHandler
-    def _build_prompt(self, context):
-        # Extract files mentioned in error if any
-        error_files = []
-        if context.get('error_output'):
-            # Simple regex to find file paths in error messages
-            file_matches = re.findall(r'\'(.*?)\'|\"(.*?)\"|\b([\/\w\.-]+\.\w+)\b', context.get('error_output', ''))
-            for match in file_matches:
-                for group in match:
-                    if group and os.path.exists(group) and os.path.isfile(group):
-                        error_files.append(group)
+    def _build_prompt(self, context, error_files=None):
+        if error_files is None:
+            error_files = referenced_files(context.get('error_output') or '', context.get('cwd'))
 
         # Gather command-specific context details
         specialized_context = ""
         if context.get('git_status'):
-            specialized_context += f"\n**Git Status**: {context['git_status'][:200]}"
+            specialized_context += f"\n**Git Status**: {context['git_status']}"
         if context.get('docker_containers'):
             specialized_context += f"\n**Docker Containers**: {', '.join(context['docker_containers'][:3])}"
         if context.get('failed_services'):
@@ -37,68 +110,54 @@ class DeepSeekLLMHandler:
 
         # File content context
         file_context = ""
-        if context.get('file_context', {}).get('file_contents'):
-            for file, content in context['file_context']['file_contents'].items():
-                if len(content) > 300:
-                    content = content[:300] + "..."
-                file_context += f"\n**File {file}**: ```\n{content}\n```"
-
-        # Build the enhanced prompt
-        prompt = f"""**[Terminal Context Analysis]**
-    **System Environment**: {context.get('env_vars', {}).get('SHELL', 'Unknown')} on {context.get('os', 'Linux')}
-    **Working Directory**: {context['cwd']} ({len(context.get('file_context', {}).get('files', []))} files)
-    **Recent Commands**: {', '.join(context.get('history', [])[-3:])}
-    **Failed Command**: `{context['command']}`
-    **Error Message**: {context['error_output']}
-    **Exit Code**: {context['exit_code']}
-    **Referenced Files**: {', '.join(error_files) if error_files else 'None detected'}
-    **Man Page Excerpt**: {context.get('man_excerpt', 'N/A')}
-    {specialized_context}
-    {file_context}
-
-    **Required Analysis Format:**
-    <think>
-    Step 1: Identify the exact error message and command that failed
-    Step 2: Analyze why the command failed (syntax, missing files, permissions, etc.)
-    Step 3: Find the correct command or fix based on context
-    Step 4: Consider any potential risks
-    </think>
-
-    Root Cause: <1-line diagnosis>
-    Fix: `[executable command]`
-    Technical Explanation: <specific system-level reason>
-    Potential Risks: <if any>
-    Prevention Tip: <actionable advice>"""
-
-        return prompt
-
-    def _format_response(self, raw):
-        # Detect reasoning model response
-        is_reasoning_model = any(x in self.manager.local_model.lower() 
-                               for x in ['deepseek', 'r1', 'think', 'expert'])
-        
-        if is_reasoning_model and '</think>' in raw:
-            # Extract all thinking blocks and final response
-            thoughts = []
-            remaining = raw
-            while '<think>' in remaining and '</think>' in remaining:
-                think_start = remaining.find('<think>') + len('<think>')
-                think_end = remaining.find('</think>')
-                if think_start > -1 and think_end > -1:
-                    thoughts.append(remaining[think_start:think_end].strip())
-                    remaining = remaining[think_end + len('</think>'):]
-            raw = remaining.strip()
-
-        # Existing cleaning logic
-        cleaned = re.sub(r'\n+', '\n', raw)
-        cleaned = re.sub(r'(\d\.\s|\*\*)', '', cleaned)
-        
-        return re.sub(
-            r'(Root Cause|Fix|Technical Explanation|Potential Risks|Prevention Tip):?',
-            lambda m: f"🔍 {m.group(1)}:" if m.group(1) == "Root Cause" else 
-                     f"🛠️ {m.group(1)}:" if m.group(1) == "Fix" else
-                     f"📚 {m.group(1)}:" if m.group(1) == "Technical Explanation" else
-                     f"⚠️ {m.group(1)}:" if m.group(1) == "Potential Risks" else
-                     f"🔒 {m.group(1)}:",
-            cleaned
-        )
\ No newline at end of file
+        if error_files:
+            file_context += f"**Referenced Files**: {', '.join(error_files)}"
+        for file, content in context.get('file_context', {}).get('file_contents', {}).items():
+            file_context += f"\n**File {file}**: ```\n{content}\n```"
+
+        man_excerpt = context.get('man_excerpt') or ''
+        if "No manual entry" in man_excerpt:
+            man_excerpt = ''
+
+        environment = (
+            f"**System Environment**: {context.get('env_vars', {}).get('SHELL', 'Unknown')} on {context.get('os', 'Linux')}\n"
+            f"**Working Directory**: {context['cwd']} ({len(context.get('file_context', {}).get('files', []))} files)\n"
+            f"**Recent Commands**: {', '.join(context.get('history', [])[-3:])}"
+            f"{specialized_context}"
+        )
+
+        # Sections in priority order: the end of the error output matters most
+        budget = PromptBudget(self.manager.backend_identity(), reserve_tokens=1024, fixed_text=ANALYSIS_FORMAT)
+        fitted = budget.fit([
+            ('error', context.get('error_output') or '', 'tail'),
+            ('command', f"**Failed Command**: `{context['command']}`\n**Exit Code**: {context['exit_code']}", 'head'),
+            ('files', file_context.strip(), 'head'),
+            ('man', man_excerpt, 'head'),
+            ('environment', environment, 'head'),
+        ])
+        self.last_prompt_usage = budget.usage
+        self.prompt_tokens_sent += budget.usage['total']
+
+        # Build the enhanced prompt, leaving out sections with nothing to say
+        sections = [fitted['environment'], fitted['command']]
+        if fitted['error']:
+            sections.append(f"**Error Message**: {fitted['error']}")
+        if fitted['files']:
+            sections.append(fitted['files'])
+        if fitted['man']:
+            sections.append(f"**Man Page Excerpt**: {fitted['man']}")
+
+        return "**[Terminal Context Analysis]**\n" + "\n".join(sections) + "\n\n" + ANALYSIS_FORMAT
+
+    @staticmethod
+    def _is_usable(response):
+        """Whether a raw response contains an actual diagnosis (hedged races skip others)"""
+        parsed = parse(response, ANALYSIS_SECTIONS)
+        return bool(parsed.get('cause') or parsed.get('fix'))
+
+    def _is_reasoning_model(self):
+        return any(x in self.manager.local_model.lower() for x in ['deepseek', 'r1', 'think', 'expert'])
+
+    def _format_parsed(self, parsed):
+        # Reasoning models think at length: their thoughts are not kept in the solution
+        return format_analysis(parsed, thoughts=not self._is_reasoning_model())
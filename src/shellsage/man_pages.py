@@ -0,0 +1,167 @@
+import os
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .cache import DiskCache
+
+# Man page excerpts are cached by the resolved man file and its mtime, so a
+# repeat failure of the same command costs a few stat() calls and one SQLite
+# lookup instead of a `man | col -b` render. Reinstalling a package changes
+# the mtime and naturally invalidates the entry.
+#
+# Man files are found with stat() calls over MANPATH (or the usual system,
+# Homebrew and Nix directories). Pages this cannot find, such as section
+# suffixes like `openssl.1ssl` or directories only listed in manpath.config,
+# are resolved with `man -w`; its answer, including "no page", is cached for
+# a day per command and MANPATH.
+
+DEFAULT_MANPATH = [
+    '/usr/local/share/man', '/usr/share/man', '/usr/local/man',
+    '/opt/homebrew/share/man', '/home/linuxbrew/.linuxbrew/share/man',
+    os.path.expanduser('~/.nix-profile/share/man'), '/run/current-system/sw/share/man',
+]
+MAN_SECTIONS = ['1', '8', '6']
+MAN_SUFFIXES = ['', '.gz', '.bz2', '.xz', '.zst']
+EXCERPT_LINES = 10
+CACHE_MAX_ENTRIES = 5000
+RESOLVE_TTL = 24 * 60 * 60
+RESOLVE_TIMEOUT = 2
+
+NO_ENTRY = "No manual entry available"
+
+
+def _man_dirs():
+    manpath = os.getenv('MANPATH')
+    if manpath:
+        # An empty element means "the default search path" in MANPATH
+        dirs = [d for d in manpath.split(':') if d]
+        if '' in manpath.split(':'):
+            dirs += DEFAULT_MANPATH
+        return dirs
+    return DEFAULT_MANPATH
+
+
+def find_man_file(command):
+    """Resolve a command's man page file with stat() calls only"""
+    if not command or '/' in command:
+        return None
+    for base in _man_dirs():
+        for section in MAN_SECTIONS:
+            for suffix in MAN_SUFFIXES:
+                path = os.path.join(base, f"man{section}", f"{command}.{section}{suffix}")
+                if os.path.isfile(path):
+                    return path
+    return None
+
+
+def man_w(command):
+    """Man file `man -w` resolves command to ('' when there is none or man fails)"""
+    try:
+        result = subprocess.run(
+            ['man', '-w', command],
+            capture_output=True,
+            text=True,
+            timeout=RESOLVE_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ''
+    lines = result.stdout.split()
+    if result.returncode != 0 or not lines or not os.path.isfile(lines[0]):
+        return ''
+    return lines[0]
+
+
+def extract_sections(content):
+    """Keep the NAME/SYNOPSIS/DESCRIPTION lines of a rendered man page"""
+    sections = []
+    current_section = None
+    for line in content.split('\n'):
+        if line.upper() in ['NAME', 'SYNOPSIS', 'DESCRIPTION']:
+            current_section = line
+            sections.append(line)
+        elif current_section and line.startswith(' '):
+            sections.append(line.strip())
+        if len(sections) > EXCERPT_LINES:  # Limit size
+            break
+    return '\n'.join(sections)
+
+
+def render_excerpt(path):
+    """Render a man file and extract its excerpt (None if man fails)"""
+    result = subprocess.run(
+        f'man -l {shlex.quote(path)} 2>/dev/null | col -b',
+        shell=True,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return extract_sections(result.stdout)
+
+
+class ManPageCache:
+    def __init__(self):
+        self.cache = DiskCache('man_excerpts', max_entries=CACHE_MAX_ENTRIES)
+        self.paths = DiskCache('man_paths', max_entries=CACHE_MAX_ENTRIES, ttl=RESOLVE_TTL)
+
+    @staticmethod
+    def _key(path):
+        return f"{path}:{os.stat(path).st_mtime_ns}"
+
+    def resolve(self, command):
+        """Man file for command: stat() lookup, else the cached `man -w` answer"""
+        path = find_man_file(command)
+        if path is not None or not command or '/' in command:
+            return path
+        key = f"{command}:{os.getenv('MANPATH', '')}"
+        resolved = self.paths.get(key)
+        if resolved is None or (resolved and not os.path.isfile(resolved)):
+            resolved = man_w(command)
+            self.paths.set(key, resolved)
+        return resolved or None
+
+    def get_excerpt(self, command):
+        """Excerpt for command, rendering and caching it on a miss"""
+        path = self.resolve(command)
+        if path is None:
+            return NO_ENTRY
+        key = self._key(path)
+        excerpt = self.cache.get(key)
+        if excerpt is None:
+            excerpt = render_excerpt(path)
+            if excerpt is None:
+                return NO_ENTRY  # Not cached: `man` itself may be missing
+            self.cache.set(key, excerpt)
+        return excerpt
+
+    def warm(self, commands, workers=4):
+        """Precompute excerpts for commands; returns the number cached"""
+        pending = set()
+        for command in commands:
+            path = find_man_file(command)
+            if path and path not in pending and self._key(path) not in self.cache:
+                pending.add(path)
+
+        def render(path):
+            excerpt = render_excerpt(path)
+            if excerpt is None:
+                return False
+            self.cache.set(self._key(path), excerpt)
+            return True
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(render, pending))
+
+
+def path_executables():
+    """Names of all executables on PATH"""
+    names = set()
+    for directory in os.getenv('PATH', '').split(os.pathsep):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        names.add(entry.name)
+        except OSError:
+            continue
+    return sorted(names)
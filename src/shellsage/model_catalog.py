@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .cache import DiskCache
+
+# Installed Ollama models with the metadata ShellSage cares about (size,
+# quantization, context length), cached per Ollama host in the state
+# directory. Within the TTL reads never touch the network. Past it, the
+# daemon returns the stale catalog and refreshes it in a background thread;
+# a one-shot command would exit before such a thread finished, so it re-reads
+# Ollama first, within REVALIDATE_TIMEOUT, and keeps the stale catalog when
+# Ollama is slow or down. Interactive model choices (setup, config) always
+# re-read the same way, so a model that was just pulled shows up. A refresh
+# only calls /api/show for models that are new or changed.
+
+DEFAULT_TTL = 60 * 60   # SHELLSAGE_MODEL_CATALOG_TTL (seconds)
+SHOW_WORKERS = 4        # Concurrent /api/show requests during a refresh
+REVALIDATE_TIMEOUT = 2  # Seconds a synchronous re-read may take
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+_background = False  # Stale catalogs are refreshed on a thread (long-lived daemon)
+
+
+def refresh_in_background_when_stale():
+    """Called by the daemon: serve stale catalogs and refresh them on a thread"""
+    global _background
+    _background = True
+
+
+def _find(models, name):
+    for entry in models:
+        if entry['name'] == name or entry['name'] == f"{name}:latest":
+            return entry
+    return None
+
+
+def _context_length(show):
+    """Trained context length from /api/show's model_info ("<arch>.context_length")"""
+    for key, value in (show.get('model_info') or {}).items():
+        if key.endswith('.context_length'):
+            return int(value)
+    return None
+
+
+def _num_ctx(show):
+    """num_ctx set in the Modelfile parameters, if any"""
+    for line in (show.get('parameters') or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == 'num_ctx':
+            try:
+                return int(parts[1])
+            except ValueError:
+                return None
+    return None
+
+
+def model_entry(tag, show=None):
+    """Catalog entry from an /api/tags model and (optionally) its /api/show"""
+    details = tag.get('details') or {}
+    show = show or {}
+    return {
+        'name': tag['name'],
+        'digest': tag.get('digest'),
+        'size': tag.get('size'),
+        'family': details.get('family'),
+        'parameter_size': details.get('parameter_size'),
+        'quantization': details.get('quantization_level'),
+        'context_length': _context_length(show),
+        'num_ctx': _num_ctx(show),
+        'capabilities': show.get('capabilities') or []
+    }
+
+
+class ModelCatalog:
+    def __init__(self, host, transport):
+        self.host = host.rstrip('/')
+        self.transport = transport
+        self.ttl = float(os.getenv('SHELLSAGE_MODEL_CATALOG_TTL', DEFAULT_TTL))
+        self.cache = DiskCache('model_catalog', max_entries=20)
+
+    def cached(self):
+        """The stored catalog ({'fetched', 'models'}) without any network access"""
+        return self.cache.get(self.host)
+
+    def is_stale(self, catalog):
+        return catalog is None or time.time() - catalog['fetched'] > self.ttl
+
+    def fetch(self, timeout=None):
+        """Read /api/tags and /api/show of new models; raises when Ollama is unreachable"""
+        options = {'timeout': timeout} if timeout else {}
+        response = self.transport.get(f"{self.host}/api/tags", **options)
+        response.raise_for_status()
+        tags = response.json().get('models', [])
+        known = {
+            entry['name']: entry for entry in (self.cached() or {}).get('models', [])
+            if entry.get('digest')
+        }
+
+        def show(tag):
+            previous = known.get(tag['name'])
+            if previous and previous['digest'] == tag.get('digest'):
+                return previous  # Unchanged since the last refresh
+            try:
+                shown = self.transport.post(f"{self.host}/api/show", json={'model': tag['name']}, **options)
+                shown.raise_for_status()
+                return model_entry(tag, shown.json())
+            except Exception:
+                return model_entry(tag)  # Older Ollama or a broken model: tags only
+
+        with ThreadPoolExecutor(max_workers=SHOW_WORKERS) as executor:
+            models = list(executor.map(show, tags))
+        catalog = {'fetched': time.time(), 'models': models}
+        self.cache.set(self.host, catalog)
+        return catalog
+
+    def refresh_in_background(self):
+        """Start a refresh unless one for this host is already running"""
+        with _refresh_lock:
+            if self.host in _refreshing:
+                return
+            _refreshing.add(self.host)
+
+        def run():
+            try:
+                self.fetch()
+            except Exception:
+                pass  # Keep serving the stale catalog
+            finally:
+                with _refresh_lock:
+                    _refreshing.discard(self.host)
+
+        threading.Thread(target=run, name='shellsage-model-catalog', daemon=True).start()
+
+    def current(self, catalog):
+        """`catalog` if fresh, else re-read (background refresh in the daemon)
+
+        Returns the stale catalog (None if there is none) when Ollama does not
+        answer within REVALIDATE_TIMEOUT.
+        """
+        if not self.is_stale(catalog):
+            return catalog
+        if _background and catalog is not None:
+            self.refresh_in_background()
+            return catalog
+        try:
+            return self.fetch(timeout=REVALIDATE_TIMEOUT)
+        except Exception:
+            return catalog
+
+    def models(self, refresh=False, revalidate=False):
+        """Catalog entries, re-read past the TTL (see current())
+
+        `refresh` re-reads Ollama now without the short timeout; `revalidate`
+        (interactive callers) re-reads it within REVALIDATE_TIMEOUT even when
+        the catalog is fresh. Both fall back to the cached entries.
+        """
+        catalog = self.cached()
+        if refresh or revalidate:
+            try:
+                catalog = self.fetch(timeout=REVALIDATE_TIMEOUT if revalidate else None)
+            except Exception:
+                pass
+        else:
+            catalog = self.current(catalog)
+        return catalog['models'] if catalog else []
+
+    def get(self, name):
+        """Cached entry for `name` (":latest" optional), without network access"""
+        catalog = self.cached()
+        return _find(catalog['models'], name) if catalog else None
+
+    def find(self, name):
+        """Entry for `name`; a model missing from the cache triggers a re-read"""
+        entry = self.get(name)
+        if entry is None:
+            try:
+                self.fetch(timeout=REVALIDATE_TIMEOUT)
+            except Exception:
+                return None
+            entry = self.get(name)
+        return entry
+
+
+def cached_model(name, host=None):
+    """Catalog entry for an Ollama model, or None
+
+    The network is only used past the TTL, as described in current().
+    """
+    import sqlite3
+    from .config import load_config
+    from .model_manager import HTTPTransport
+
+    try:
+        catalog = ModelCatalog(host or load_config().ollama_host, HTTPTransport())
+        stored = catalog.current(catalog.cached())
+    except (sqlite3.Error, OSError):
+        return None
+    return _find(stored['models'], name) if stored else None
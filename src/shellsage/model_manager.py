@@ -1,105 +1,386 @@
-from .helpers import update_env_variable
+from .config import load_config
+from .helpers import update_env_variables
+from .profiling import span
 import os
-import yaml
-import requests
-from pathlib import Path
-from openai import OpenAI
-import inquirer
-from anthropic import Anthropic
-from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_KEEP_ALIVE = '30m'  # SHELLSAGE_KEEP_ALIVE, any Ollama duration ("10m", "1h", "-1")
+DEFAULT_HEDGE_DELAY = 3.0   # Seconds before the hedge fires while the primary has no latency history
+
+# Provider SDKs, requests and inquirer are imported lazily (see the note in cli.py)
 
 
 # Define providers at module level
 PROVIDERS = {
     'groq': {
-        'client': OpenAI,
+        'client': 'openai',
         'base_url': 'https://api.groq.com/openai/v1',
         'models': ['llama-3.1-8b-instant', 'deepseek-r1-distill-llama-70b', 'gemma2-9b-it', 'llama-3.3-70b-versatile', 'llama3-70b-8192', 'llama3-8b-8192', 'mixtral-8x7b-32768']
     },
     'openai': {
-        'client': OpenAI,
+        'client': 'openai',
         'base_url': 'https://api.openai.com/v1',
         'models': ['gpt-4o', 'chatgpt-4o-latest', 'o1', 'o1-mini', 'o1-preview', 'gpt-4o-2024-08-06', 'gpt-4o-mini-2024-07-18', 'gpt-4-turbo', 'gpt-3.5-turbo']
     },
     'anthropic': {
-        'client': Anthropic,
+        'client': 'anthropic',
         'models': ['claude-3-5-sonnet-20241022', 'claude-3-opus-20240229', 'claude-3-sonnet-20240229']
     },
     'fireworks': {
-        'client': OpenAI,
+        'client': 'openai',
         'base_url': 'https://api.fireworks.ai/inference/v1',
         'models': ['accounts/fireworks/models/llama-v3p1-405b-instruct', 'accounts/fireworks/models/deepseek-v3', 'accounts/fireworks/models/llama-v3p1-8b-instruct', 'accounts/fireworks/models/llama-v3p3-70b-instruct']
     },
     'openrouter': {
-        'client': OpenAI,
+        'client': 'openai',
         'base_url': 'https://openrouter.ai/api/v1',
         'models': ['deepseek/deepseek-r1-distill-llama-70b:free', 'deepseek/deepseek-r1-distill-qwen-32b', 'mistralai/mistral-small-24b-instruct-2501', 'openai/gpt-3.5-turbo-instruct', 'microsoft/phi-4', 'google/gemini-2.0-flash-thinking-exp:free', 'google/gemini-2.0-pro-exp-02-05:free', 'deepseek/deepseek-r1:free', 'qwen/qwen-vl-plus:free']
     },
     'deepseek': {
-        'client': OpenAI,
+        'client': 'openai',
         'base_url': 'https://api.deepseek.com/v1',
         'models': ['deepseek-chat']
     }
 }
 
+# ctransformers models stay loaded for the life of the process (the daemon's,
+# when one runs). Only SHELLSAGE_HF_MAX_MODELS are kept; switching LOCAL_MODEL
+# evicts the least recently used one instead of leaking its weights.
+_hf_models = OrderedDict()
+_hf_lock = threading.RLock()
+
+
+def _hf_model(model_path):
+    """Loaded ctransformers model for model_path, loading it on first use"""
+    with _hf_lock:
+        if model_path in _hf_models:
+            _hf_models.move_to_end(model_path)
+            return _hf_models[model_path]
+        max_models = max(1, int(os.getenv('SHELLSAGE_HF_MAX_MODELS', 1)))
+        if len(_hf_models) >= max_models:
+            while len(_hf_models) >= max_models:
+                _hf_models.popitem(last=False)
+            import gc
+            gc.collect()  # Release the evicted weights before mapping new ones
+
+        from ctransformers import AutoModelForCausalLM
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path,
+            model_type=os.getenv('LOCAL_MODEL_TYPE', 'llama'),
+            threads=int(os.getenv('SHELLSAGE_HF_THREADS', 0)) or os.cpu_count(),
+            mmap=True
+        )
+        _hf_models[model_path] = model
+        return model
+
+
+def _unload_hf_model(model_path=None):
+    """Drop one cached model (all if model_path is None); True if any was loaded"""
+    with _hf_lock:
+        if model_path is None:
+            unloaded = bool(_hf_models)
+            _hf_models.clear()
+        else:
+            unloaded = _hf_models.pop(model_path, None) is not None
+    import gc
+    gc.collect()
+    return unloaded
+
+
+def _load_client_class(client):
+    """Import the SDK client class for a provider only when it is needed"""
+    if client == 'openai':
+        from openai import OpenAI
+        return OpenAI
+    if client == 'anthropic':
+        from anthropic import Anthropic
+        return Anthropic
+    raise ValueError(f"Unsupported client: {client}")
+
+
+def _sdk_timeout(client, transport):
+    """The transport's connect and read timeouts as the SDK's (httpx) Timeout
+
+    A bare float would bound connecting too, on every retry, so an
+    unreachable API host would hang for minutes instead of seconds.
+    """
+    if client == 'openai':
+        from openai import Timeout
+    else:
+        from anthropic import Timeout
+    return Timeout(transport.read_timeout, connect=transport.connect_timeout)
+
+
+class HTTPTransport:
+    """Pooled keep-alive HTTP client shared by every local-model request
+
+    Connect and read timeouts are separate so a dead server fails fast while
+    a slow generation is still allowed to finish; transient failures (refused
+    connections, 502/503/504) are retried with backoff. Latency is recorded
+    per endpoint.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None, retries=None):
+        self.pool_size = pool_size or int(os.getenv('SHELLSAGE_HTTP_POOL', 8))
+        self.connect_timeout = connect_timeout or float(os.getenv('SHELLSAGE_CONNECT_TIMEOUT', 3))
+        self.read_timeout = read_timeout or float(os.getenv('SHELLSAGE_READ_TIMEOUT', 300))
+        self.retries = retries if retries is not None else int(os.getenv('SHELLSAGE_HTTP_RETRIES', 2))
+        self._session = None
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # read=0: a request that reached the server is never replayed,
+            # generation is too expensive to run twice
+            retry = Retry(
+                total=self.retries,
+                connect=self.retries,
+                read=0,
+                status=self.retries,
+                backoff_factor=0.25,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=None,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def request(self, method, url, **kwargs):
+        """Send a request over the pool; streamed responses are timed to their headers"""
+        from urllib.parse import urlsplit
+
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = f"{method.upper()} {urlsplit(url).path}"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self._record(endpoint, None)
+            raise
+        self._record(endpoint, time.perf_counter() - start)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, endpoint, latency):
+        with self._lock:
+            if latency is None:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+            else:
+                self._latencies.setdefault(endpoint, deque(maxlen=256)).append(latency)
+
+    def stats(self):
+        """Per-endpoint request counts, errors and latency percentiles (ms)"""
+        with self._lock:
+            snapshot = {endpoint: sorted(samples) for endpoint, samples in self._latencies.items()}
+            errors = dict(self._errors)
+        stats = {}
+        for endpoint in set(snapshot) | set(errors):
+            samples = snapshot.get(endpoint, [])
+            entry = {'count': len(samples), 'errors': errors.get(endpoint, 0)}
+            if samples:
+                entry.update({
+                    'p50_ms': round(samples[len(samples) // 2] * 1000, 1),
+                    'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+                    'max_ms': round(samples[-1] * 1000, 1)
+                })
+            stats[endpoint] = entry
+        return stats
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Process-wide transport, so reloaded ModelManagers keep the warm pool"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HTTPTransport()
+        return _transport
+
+
 class ModelManager:
     PROVIDERS = PROVIDERS  # Add this line to expose the module-level PROVIDERS
     
-    def __init__(self):
-        load_dotenv(override=True)
-        self.mode = os.getenv('MODE', 'local')
-        self.local_model = os.getenv('LOCAL_MODEL', 'llama3:8b-instruct-q4_1')
+    def __init__(self, backend=None):
+        """`backend` ("api:<provider>[:<model>]" or "local[:<model>]") overrides the .env selection"""
+        self.config = load_config()  # Parsed once per .env change, not per manager
+        self.mode = self.config.mode
+        self.local_model = self.config.local_model
+        self.local_provider = self.config.local_provider  # or 'ctransformers'
+        self.keep_alive = os.getenv('SHELLSAGE_KEEP_ALIVE', DEFAULT_KEEP_ALIVE)
+        self.api_provider = None  # None: follow ACTIVE_API_PROVIDER / API_MODEL
+        self.api_model = None
+        if backend:
+            self._use_backend(backend)
+        # Opt-in hedging: race a second backend when this one is slow
+        self.hedge_backend = None if backend else os.getenv('SHELLSAGE_HEDGE_BACKEND')
+        self._hedge_partner = None
+        self._fallbacks = None if not backend else []  # Only the configured backend falls back
+        self._backend_stats = None
+        self.rate_limiter = None  # Set by batch modes: acquire(provider) before each request
         self.client = None
+        self.transport = get_transport()
         self._init_client()
+
+    def _use_backend(self, spec):
+        mode, _, rest = spec.partition(':')
+        if mode == 'api':
+            provider, _, model = rest.partition(':')
+            if provider not in self.PROVIDERS:
+                raise ValueError(f"Unknown provider in backend '{spec}'")
+            self.api_provider = provider
+            self.api_model = model or None
+        elif mode == 'local':
+            if rest:
+                self.local_model = rest
+        else:
+            raise ValueError(f"Invalid backend '{spec}', expected api:<provider>[:<model>] or local[:<model>]")
+        self.mode = mode
+
+    def _active_provider(self):
+        return self.api_provider or self.config.api_provider
+
+    def _active_api_model(self):
+        return self.api_model or self.config.api_model
         
     def _init_client(self):
         """Initialize active client based on config"""
         if self.mode == 'api':
-            provider = os.getenv('ACTIVE_API_PROVIDER', 'groq')
-            api_key = os.environ.get(f"{provider.upper()}_API_KEY")
+            provider = self._active_provider()
+            api_key = self.config.api_key(provider)
             
             if not api_key:
                 raise ValueError(f"API key for {provider} not set. Run 'shellsage setup'")
 
-            if self.PROVIDERS[provider]['client'] == OpenAI:
+            if self.PROVIDERS[provider]['client'] == 'openai':
+                OpenAI = _load_client_class('openai')
                 self.client = OpenAI(
                     api_key=api_key,
-                    base_url=self.PROVIDERS[provider].get('base_url')
+                    # <PROVIDER>_BASE_URL points a provider at a proxy or test server
+                    base_url=os.getenv(f"{provider.upper()}_BASE_URL") or self.PROVIDERS[provider].get('base_url'),
+                    timeout=_sdk_timeout('openai', self.transport),
+                    max_retries=self.transport.retries
                 )
             # Special case for Anthropic
             elif provider == 'anthropic':
-                self.client = Anthropic(api_key=api_key)
+                Anthropic = _load_client_class('anthropic')
+                self.client = Anthropic(
+                    api_key=api_key,
+                    timeout=_sdk_timeout('anthropic', self.transport),
+                    max_retries=self.transport.retries
+                )
             else:
                 raise ValueError(f"Unsupported provider: {provider}")
         else:
             # Initialize local client if needed
             self.client = "ollama"  # Just a flag for local mode
 
-    def switch_mode(self, new_mode, model_name=None):
-        """Change mode with optional model selection"""
-        update_env_variable('MODE', new_mode)
-        
+    def switch_mode(self, new_mode, model_name=None, settings=None):
+        """Change mode with optional model selection
+
+        `settings` are further .env variables (e.g. an API key) saved in the
+        same write.
+        """
+        changes = dict(settings or {}, MODE=new_mode)
         if new_mode == 'local' and model_name:
-            update_env_variable('LOCAL_MODEL', model_name)
+            changes['LOCAL_MODEL'] = model_name
         elif new_mode == 'api' and model_name:
-            provider = next(p for p in self.PROVIDERS if model_name in self.PROVIDERS[p]['models'])
-            update_env_variable('ACTIVE_API_PROVIDER', provider)
-            update_env_variable('API_MODEL', model_name)
-            
-        load_dotenv(override=True)
+            provider = changes.get('ACTIVE_API_PROVIDER') or next(
+                (p for p in self.PROVIDERS if model_name in self.PROVIDERS[p]['models']),
+                self._active_provider()
+            )
+            changes['ACTIVE_API_PROVIDER'] = provider
+            changes['API_MODEL'] = model_name
+
+        self.config = update_env_variables(changes)
+        self.mode = new_mode
+        if new_mode == 'local' and model_name:
+            self.local_model = model_name
         self._init_client()
 
+    @property
+    def catalog(self):
+        from .model_catalog import ModelCatalog
+        return ModelCatalog(self.config.ollama_host, self.transport)
+
     def get_ollama_models(self):
-        """List installed Ollama models"""
+        """Installed Ollama models for an interactive choice (revalidated, see model_catalog)"""
+        return [entry['name'] for entry in self.catalog.models(revalidate=True)]
+
+    def preload(self, keep_alive=None):
+        """Load LOCAL_MODEL into Ollama and keep it resident for `keep_alive`
+
+        Returns the wall-clock seconds of the request and the part of it
+        Ollama spent loading the model (0 when it was already warm).
+        """
+        if self.mode != 'local':
+            raise RuntimeError("Preloading only applies to local mode")
+        if self.local_provider != 'ollama':
+            start = time.perf_counter()
+            try:
+                with _hf_lock:
+                    cached = self.local_model in _hf_models
+                    _hf_model(self.local_model)
+            except Exception as e:
+                raise RuntimeError(f"HuggingFace error: {str(e)}")
+            seconds = time.perf_counter() - start
+            return {'model': self.local_model, 'seconds': seconds, 'load_seconds': 0 if cached else seconds}
+        ollama_host = self.config.ollama_host
+        start = time.perf_counter()
         try:
-            ollama_host = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
-            response = requests.get(f"{ollama_host}/api/tags")
-            return [m['name'] for m in response.json().get('models', [])]
-        except requests.ConnectionError:
-            return []
+            # A generate request without a prompt only loads the model
+            response = self.transport.post(
+                f"{ollama_host}/api/generate",
+                json={"model": self.local_model, "keep_alive": self.keep_alive if keep_alive is None else keep_alive}
+            )
+            response.raise_for_status()
+            body = response.json()
+        except Exception as e:
+            raise RuntimeError(f"Ollama error: {str(e)}")
+        return {
+            'model': self.local_model,
+            'seconds': time.perf_counter() - start,
+            'load_seconds': body.get('load_duration', 0) / 1e9
+        }
+
+    def unload(self):
+        """Release LOCAL_MODEL's memory now"""
+        if self.local_provider != 'ollama':
+            return _unload_hf_model(self.local_model)
+        return self.preload(keep_alive=0)
 
     def interactive_setup(self):
         """Guide user through configuration"""
+        import inquirer
         questions = [
             inquirer.List('mode',
                 message="Select operation mode:",
@@ -108,8 +389,10 @@ class ModelManager:
             ),
             inquirer.List('local_model',
                 message="Select local model:",
-                choices=self.get_ollama_models(),
-                default=self.local_model
+                # Only asked (and Ollama only queried) in local mode
+                choices=lambda answers: self.get_ollama_models(),
+                default=self.local_model,
+                ignore=lambda x: x['mode'] != 'local'
             ),
             inquirer.Text('api_key',
                 message="Enter Groq API key:",
@@ -125,10 +408,10 @@ class ModelManager:
     def _update_config(self, answers):
         """Update configuration from answers"""
         self.mode = answers['mode']
-        self.local_model = answers['local_model']
+        self.local_model = answers.get('local_model') or self.local_model
         os.environ["ACTIVE_API_PROVIDER"] = "groq" if self.mode == 'api' else ""  # Fixed provider assignment
         os.environ["GROQ_API_KEY"] = answers['api_key']
-        load_dotenv(override=True)
+        self.config = load_config()
 
     def list_local_models(self):
         """Get all available local models"""
@@ -137,22 +420,252 @@ class ModelManager:
             models = self.get_ollama_models()
         return models
     
-    def generate(self, prompt, max_tokens=512):
-        """Unified generation interface"""
+    def backend_identity(self):
+        """(mode, provider, model) of the backend that answers generate()"""
+        if self.mode == 'api':
+            return ('api', self._active_provider(), self._active_api_model())
+        return ('local', self.local_provider, self.local_model)
+
+    def generate(self, prompt, max_tokens=512, accept=None):
+        """Unified generation interface
+
+        `accept(response)` tells hedged generation whether an answer is
+        usable; an unusable first answer does not win the race.
+        """
+        from .backend_stats import backend_key
+
+        with span('generate', prompt_chars=len(prompt)) as generate_span:
+            if self.hedge_partner is not None:
+                generate_span.set(hedged=True)
+                return self._hedged_generate(prompt, max_tokens, accept)
+            errors = []
+            for manager in self.fallback_chain():
+                if not manager.backend_allowed():
+                    errors.append(manager._circuit_open_message())
+                    continue
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(manager.backend_identity()[1])
+                start = time.perf_counter()
+                try:
+                    if manager.mode == 'api':
+                        response = manager._api_generate(prompt, max_tokens)
+                    else:
+                        response = manager._local_generate(prompt)
+                except Exception as e:
+                    manager._record_latency(time.perf_counter() - start, ok=False)
+                    errors.append(str(e))
+                    continue
+                manager._record_latency(time.perf_counter() - start)
+                generate_span.set(backend=backend_key(manager.backend_identity()), failed_backends=len(errors))
+                return response
+            raise RuntimeError(f"Generation failed: {'; '.join(errors)}")
+
+    def generate_stream(self, prompt, max_tokens=512, accept=None):
+        """Yield the completion in chunks as the backend produces them
+
+        Hedged generation cannot know the winner before it finishes, so it
+        yields the winning answer as a single chunk.
+        """
+        from .backend_stats import backend_key
+
+        with span('generate.stream', prompt_chars=len(prompt)) as generate_span:
+            if self.hedge_partner is not None:
+                generate_span.set(hedged=True)
+                yield self._hedged_generate(prompt, max_tokens, accept)
+                return
+            errors = []
+            for manager in self.fallback_chain():
+                if not manager.backend_allowed():
+                    errors.append(manager._circuit_open_message())
+                    continue
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(manager.backend_identity()[1])
+                start = time.perf_counter()
+                first = None
+                chunks = 0
+                try:
+                    for chunk in manager._backend_stream(prompt, max_tokens):
+                        if first is None:
+                            first = time.perf_counter()
+                        chunks += 1
+                        yield chunk
+                except Exception as e:
+                    manager._record_latency(time.perf_counter() - start, ok=False)
+                    if chunks:
+                        # Output already reached the caller: switching backends would garble it
+                        raise RuntimeError(f"Generation failed: {str(e)}")
+                    errors.append(str(e))
+                    continue
+                end = time.perf_counter()
+                manager._record_latency(end - start)
+                # Backends stream about one token per chunk
+                generate_span.set(
+                    backend=backend_key(manager.backend_identity()),
+                    failed_backends=len(errors),
+                    ttft_ms=round((first - start) * 1000, 1) if first else None,
+                    chunks=chunks,
+                    tokens_per_sec=round(chunks / (end - first), 1) if first and end > first else None
+                )
+                return
+            raise RuntimeError(f"Generation failed: {'; '.join(errors)}")
+
+    def _backend_stream(self, prompt, max_tokens):
+        if self.mode == 'api':
+            return self._api_generate_stream(prompt, max_tokens)
+        if self.local_provider == 'ollama':
+            return self._ollama_generate_stream(prompt)
+        return self._hf_generate_stream(prompt)
+
+    @property
+    def backend_stats(self):
+        if self._backend_stats is None:
+            from .backend_stats import BackendStats
+            self._backend_stats = BackendStats()
+        return self._backend_stats
+
+    def _record_latency(self, seconds, ok=True):
+        import sqlite3
+        from .backend_stats import backend_key
+
         try:
-            if self.mode == 'api':
-                return self._api_generate(prompt, max_tokens)
-            return self._local_generate(prompt)
-        except Exception as e:
-            raise RuntimeError(f"Generation failed: {str(e)}")
+            self.backend_stats.record(backend_key(self.backend_identity()), seconds, ok)
+        except (sqlite3.Error, OSError):
+            pass  # Statistics must never fail a generation
+
+    def fallback_chain(self):
+        """This backend followed by the usable SHELLSAGE_FALLBACK backends, in order"""
+        if self._fallbacks is None:
+            self._fallbacks = []
+            seen = {self.backend_identity()}
+            specs = os.getenv('SHELLSAGE_FALLBACK', '').split(',')
+            for spec in filter(None, (part.strip() for part in specs)):
+                try:
+                    manager = ModelManager(backend=spec)
+                except Exception:
+                    continue  # e.g. no API key for that provider
+                if manager.backend_identity() not in seen:
+                    seen.add(manager.backend_identity())
+                    self._fallbacks.append(manager)
+        return [self] + self._fallbacks
+
+    def backend_allowed(self):
+        """False while this backend's circuit breaker is open"""
+        from .backend_stats import backend_key
+
+        try:
+            return self.backend_stats.allow(backend_key(self.backend_identity()))
+        except Exception:
+            return True
+
+    def _circuit_open_message(self):
+        from .backend_stats import backend_key
+
+        key = backend_key(self.backend_identity())
+        return f"{key} skipped after repeated failures (retrying in {self.backend_stats.retry_in(key):.0f}s)"
+
+    @property
+    def hedge_partner(self):
+        """ModelManager for SHELLSAGE_HEDGE_BACKEND, or None when hedging is off or unusable"""
+        if self.hedge_backend and self._hedge_partner is None:
+            try:
+                partner = ModelManager(backend=self.hedge_backend)
+            except Exception:
+                partner = None  # e.g. no API key: run unhedged
+            if partner is None or partner.backend_identity() == self.backend_identity():
+                self.hedge_backend = None
+            else:
+                self._hedge_partner = partner
+        return self._hedge_partner if self.hedge_backend else None
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before firing the hedge (its p95 latency by default)"""
+        from .backend_stats import backend_key
+
+        if os.getenv('SHELLSAGE_HEDGE_DELAY'):
+            return float(os.getenv('SHELLSAGE_HEDGE_DELAY'))
+        try:
+            p95 = self.backend_stats.percentile(backend_key(self.backend_identity()), 95)
+        except Exception:
+            p95 = None
+        return DEFAULT_HEDGE_DELAY if p95 is None else min(max(p95, 0.2), 30.0)
+
+    def _race_leg(self, prompt, max_tokens, cancel):
+        """Generate for a hedged race; returns None once the race is decided elsewhere"""
+        from .backend_stats import backend_key
+
+        if not self.backend_allowed():
+            raise RuntimeError(self._circuit_open_message())
+        with span('generate.hedge_leg', backend=backend_key(self.backend_identity())) as leg_span:
+            start = time.perf_counter()
+            stream = self._backend_stream(prompt, max_tokens)
+            chunks = []
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        leg_span.set(cancelled=True)
+                        return None  # Closing the stream drops the backend's connection
+                    chunks.append(chunk)
+            except Exception:
+                self._record_latency(time.perf_counter() - start, ok=False)
+                raise
+            finally:
+                stream.close()
+            self._record_latency(time.perf_counter() - start)
+            return ''.join(chunks)
+
+    def _hedged_generate(self, prompt, max_tokens, accept=None):
+        """Run the primary, add the hedge backend after hedge_delay(), keep the first usable answer"""
+        import queue
+
+        accept = accept or (lambda response: bool(response and response.strip()))
+        cancel = threading.Event()
+        results = queue.Queue()
+
+        def run(manager):
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(manager.backend_identity()[1])
+                results.put((manager._race_leg(prompt, max_tokens, cancel), None))
+            except Exception as e:
+                results.put((None, e))
+
+        def start(manager):
+            # Daemon threads: a losing backend must not keep the CLI from exiting
+            threading.Thread(target=run, args=(manager,), daemon=True).start()
+
+        start(self)
+        outstanding, hedged = 1, False
+        fallback, error = None, None
+        while outstanding:
+            try:
+                response, exc = results.get(timeout=None if hedged else self.hedge_delay())
+            except queue.Empty:
+                start(self.hedge_partner)
+                outstanding, hedged = outstanding + 1, True
+                continue
+            outstanding -= 1
+            if exc is None and accept(response):
+                cancel.set()
+                return response
+            if exc is not None:
+                error = exc
+            elif fallback is None:
+                fallback = response
+            if not hedged:
+                # The primary failed or answered unusably: hedge right away
+                start(self.hedge_partner)
+                outstanding, hedged = outstanding + 1, True
+        if fallback is not None:
+            return fallback
+        raise RuntimeError(f"Generation failed: {str(error)}")
 
     def _api_generate(self, prompt, max_tokens):
         """Generate using selected API provider"""
-        provider = os.getenv('ACTIVE_API_PROVIDER', 'groq')
-        model = os.getenv('API_MODEL')  # New environment variable
+        provider = self._active_provider()
+        model = self._active_api_model()
         
         try:
-            if self.PROVIDERS[provider]['client'] == OpenAI:
+            if self.PROVIDERS[provider]['client'] == 'openai':
                 response = self.client.chat.completions.create(
                     model=model,
                     messages=[{"role": "user", "content": prompt}],
@@ -170,52 +683,113 @@ class ModelManager:
         except Exception as e:
             raise RuntimeError(f"API Error ({provider}): {str(e)}")
 
+    def _api_generate_stream(self, prompt, max_tokens):
+        """Stream from the selected API provider"""
+        provider = self._active_provider()
+        model = self._active_api_model()
+
+        try:
+            if self.PROVIDERS[provider]['client'] == 'openai':
+                stream = self.client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.1,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            elif provider == 'anthropic':
+                stream = self.client.messages.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True
+                )
+                for event in stream:
+                    if event.type == 'content_block_delta' and getattr(event.delta, 'text', None):
+                        yield event.delta.text
+        except Exception as e:
+            raise RuntimeError(f"API Error ({provider}): {str(e)}")
+
     def _local_generate(self, prompt):
         """Generate using local provider"""
-        if self.mode == 'local':
+        if self.local_provider == 'ollama':
             return self._ollama_generate(prompt)
         return self._hf_generate(prompt)
 
-    # model_manager.py
+    def _ollama_payload(self, prompt, stream):
+        # Detect if it's a reasoning model based on model name
+        is_reasoning_model = any(x in self.local_model.lower() for x in ['deepseek', 'r1', 'think', 'expert'])
 
-    def _ollama_generate(self, prompt):
-        try:
-            ollama_host = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
-            # Detect if it's a reasoning model based on model name
-            is_reasoning_model = any(x in self.local_model.lower() for x in ['deepseek', 'r1', 'think', 'expert'])
+        options = {
+            "temperature": 0.1,
+            "num_predict": 200048
+        }
 
-            options = {
-                "temperature": 0.1,
-                "num_predict": 200048
-            }
+        # Only set stop tokens for non-reasoning models
+        if not is_reasoning_model:
+            options["stop"] = ["\n\n\n", "USER QUERY:"]
 
-            # Only set stop tokens for non-reasoning models
-            if not is_reasoning_model:
-                options["stop"] = ["\n\n\n", "USER QUERY:"]
+        return {
+            "model": self.local_model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
 
-            response = requests.post(
+    def _ollama_generate(self, prompt):
+        try:
+            ollama_host = self.config.ollama_host
+            response = self.transport.post(
                 f"{ollama_host}/api/generate",
-                json={
-                    "model": self.local_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": options
-                }
+                json=self._ollama_payload(prompt, stream=False)
             )
             response.raise_for_status()
             return response.json()['response']
         except Exception as e:
             raise RuntimeError(f"Ollama error: {str(e)}")
+
+    def _ollama_generate_stream(self, prompt):
+        """Stream tokens from Ollama's newline-delimited JSON responses"""
+        import json
+
+        try:
+            ollama_host = self.config.ollama_host
+            with self.transport.post(
+                f"{ollama_host}/api/generate",
+                json=self._ollama_payload(prompt, stream=True),
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise RuntimeError(chunk['error'])
+                    if chunk.get('response'):
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        break
+        except Exception as e:
+            raise RuntimeError(f"Ollama error: {str(e)}")
     
     def _hf_generate(self, prompt):
         """Generate using HuggingFace model"""
-        from ctransformers import AutoModelForCausalLM
-        
         try:
-            model = AutoModelForCausalLM.from_pretrained(
-                model_path=self.local_model,
-                model_type='llama'
-            )
-            return model(prompt)
+            model = _hf_model(self.local_model)
+            with _hf_lock:  # ctransformers models are not safe to share between threads
+                return model(prompt)
+        except Exception as e:
+            raise RuntimeError(f"HuggingFace error: {str(e)}")
+
+    def _hf_generate_stream(self, prompt):
+        try:
+            model = _hf_model(self.local_model)
+            with _hf_lock:
+                yield from model(prompt, stream=True)
         except Exception as e:
-            raise RuntimeError(f"HuggingFace error: {str(e)}")
\ No newline at end of file
+            raise RuntimeError(f"HuggingFace error: {str(e)}")
@@ -0,0 +1,172 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Timing spans around the stages of an analysis (context probes, prompt
+# building, generation, parsing, rendering). Spans cost almost nothing
+# unless SHELLSAGE_PROFILE is set or a listener is attached:
+#
+#   SHELLSAGE_PROFILE=1            write a Chrome trace to $SHELLSAGE_HOME/profiles
+#   SHELLSAGE_PROFILE=/tmp/t.json  write it to that file
+#   SHELLSAGE_PROFILE_FORMAT=json  plain span list instead of Chrome's trace format
+#
+# Chrome traces open in chrome://tracing or https://ui.perfetto.dev. In
+# process, add_listener(callback) receives every finished span as a dict.
+
+_lock = threading.Lock()
+_listeners = []
+_spans = []
+_origin = time.perf_counter()
+_writer_registered = False
+MAX_SPANS = 100000  # A long-running daemon keeps only this many for its trace
+
+
+def profile_target():
+    """Value of SHELLSAGE_PROFILE, or None when profiling is off"""
+    value = os.getenv('SHELLSAGE_PROFILE', '').strip()
+    return None if value in ('', '0') else value
+
+
+def add_listener(callback):
+    """Call `callback(span)` for every finished span (a dict, see Span.to_dict)"""
+    with _lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    with _lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def enabled():
+    return bool(_listeners) or profile_target() is not None
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **attrs):
+        """Attach attributes (token counts, cache hits, ...) to the span"""
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start_ms': round((self.start - _origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+            'thread': self.thread,
+            'attrs': self.attrs
+        }
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as `name`; yields a span accepting set(**attrs)"""
+    if not enabled():
+        yield _NULL_SPAN
+        return
+    current = Span(name, attrs)
+    try:
+        yield current
+    except GeneratorExit:
+        current.set(cancelled=True)  # A streaming consumer stopped early
+        raise
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _finish(current)
+
+
+def _finish(current):
+    record = current.to_dict()
+    with _lock:
+        listeners = list(_listeners)
+        if profile_target() is not None and len(_spans) < MAX_SPANS:
+            _spans.append(record)
+            _register_writer()
+    for callback in listeners:
+        try:
+            callback(record)
+        except Exception:
+            pass  # Instrumentation must never break an analysis
+
+
+def spans():
+    """Spans recorded so far for SHELLSAGE_PROFILE"""
+    with _lock:
+        return list(_spans)
+
+
+def _register_writer():
+    global _writer_registered
+    if not _writer_registered:
+        _writer_registered = True
+        atexit.register(write_trace)
+
+
+def chrome_trace(records):
+    """Chrome trace-event document for span records"""
+    pid = os.getpid()
+    threads = {}
+    events = []
+    for record in records:
+        tid = threads.setdefault(record['thread'], len(threads) + 1)
+        events.append({
+            'name': record['name'],
+            'ph': 'X',
+            'ts': round(record['start_ms'] * 1000),
+            'dur': max(1, round(record['duration_ms'] * 1000)),
+            'pid': pid,
+            'tid': tid,
+            'args': record['attrs']
+        })
+    for thread, tid in threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_trace(path=None):
+    """Write the recorded spans to `path` (SHELLSAGE_PROFILE by default); returns the path"""
+    import json
+
+    records = spans()
+    target = path or profile_target()
+    if not records or target is None:
+        return None
+    if target == '1':
+        from .helpers import get_state_dir
+        directory = get_state_dir() / 'profiles'
+        directory.mkdir(exist_ok=True)
+        target = str(directory / f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    if os.getenv('SHELLSAGE_PROFILE_FORMAT', 'chrome') == 'json':
+        document = {'pid': os.getpid(), 'spans': records}
+    else:
+        document = chrome_trace(records)
+    try:
+        with open(target, 'w') as f:
+            json.dump(document, f, default=str)
+    except OSError:
+        return None
+    return target
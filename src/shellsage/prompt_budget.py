@@ -0,0 +1,130 @@
+import os
+
+# Prompt sections are sized against the target model's context window instead
+# of per-section magic constants. Sections are listed in priority order; each
+# first receives a small floor so low-priority context is not starved, then the
+# rest of the budget goes to sections in priority order. Oversized sections are
+# cut at line boundaries, keeping the tail of logs and the head of everything
+# else.
+
+# Context windows in tokens, matched as substrings of the model name (most
+# specific first)
+CONTEXT_WINDOWS = [
+    ('llama3-70b-8192', 8192),
+    ('llama3-8b-8192', 8192),
+    ('mixtral-8x7b-32768', 32768),
+    ('llama-3.1', 131072),
+    ('llama-3.3', 131072),
+    ('llama-v3p1', 131072),
+    ('llama-v3p3', 131072),
+    ('gemma2', 8192),
+    ('gpt-4o', 128000),
+    ('chatgpt-4o', 128000),
+    ('gpt-4-turbo', 128000),
+    ('gpt-3.5-turbo-instruct', 4096),
+    ('gpt-3.5-turbo', 16385),
+    ('o1', 128000),
+    ('claude-3', 200000),
+    ('deepseek-r1', 64000),
+    ('deepseek', 64000),
+    ('gemini', 1000000),
+    ('phi-4', 16384),
+    ('mistral-small', 32768),
+    ('qwen', 32768),
+]
+# Ollama truncates prompts to its num_ctx, whatever the model supports; this
+# is its default when the model catalog knows no num_ctx for the model
+OLLAMA_WINDOW = 4096
+DEFAULT_WINDOW = 8192
+
+# Longer prompts cost latency and money even when the window allows them
+DEFAULT_PROMPT_TOKENS = 3000   # SHELLSAGE_PROMPT_TOKENS
+FLOOR_SHARE = 0.08             # Minimum share of the budget each section may claim
+CHARS_PER_TOKEN = 4
+
+
+def context_window(identity):
+    """Context window (tokens) of the backend identified by (mode, provider, model)"""
+    override = os.getenv('SHELLSAGE_CONTEXT_WINDOW')
+    if override:
+        return int(override)
+    mode, provider, model = identity
+    if mode == 'local' and provider == 'ollama':
+        return ollama_window(model)
+    name = (model or '').lower()
+    for pattern, window in CONTEXT_WINDOWS:
+        if pattern in name:
+            return window
+    return DEFAULT_WINDOW
+
+
+def ollama_window(model):
+    """num_ctx of an Ollama model from the cached catalog, capped by its trained context"""
+    from .model_catalog import cached_model
+
+    entry = cached_model(model) if model else None
+    if entry is None:
+        return OLLAMA_WINDOW
+    window = entry.get('num_ctx') or OLLAMA_WINDOW
+    if entry.get('context_length'):
+        window = min(window, entry['context_length'])
+    return window
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English and code)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def truncate(text, tokens, keep='head'):
+    """Cut text to about `tokens` tokens at a line boundary"""
+    if estimate_tokens(text) <= tokens:
+        return text
+    limit = max(0, tokens * CHARS_PER_TOKEN)
+    if keep == 'tail':
+        kept = text[len(text) - limit:] if limit else ''
+        newline = kept.find('\n')
+        if 0 <= newline < len(kept) - 1:
+            kept = kept[newline + 1:]
+        omitted = text[:len(text) - len(kept)].count('\n')
+        return f"[... {omitted} earlier lines omitted]\n{kept}"
+    kept = text[:limit]
+    newline = kept.rfind('\n')
+    if newline > 0:
+        kept = kept[:newline]
+    return f"{kept}\n[...]"
+
+
+class PromptBudget:
+    def __init__(self, identity, reserve_tokens=1024, fixed_text=''):
+        self.window = context_window(identity)
+        cap = int(os.getenv('SHELLSAGE_PROMPT_TOKENS', DEFAULT_PROMPT_TOKENS))
+        # The reply and the fixed instructions come out of the same window
+        self.budget = max(0, min(self.window - reserve_tokens, cap) - estimate_tokens(fixed_text))
+        self.fixed_tokens = estimate_tokens(fixed_text)
+        self.usage = None
+
+    def fit(self, sections):
+        """Trim [(name, text, keep), ...] (highest priority first) to the budget
+
+        Returns {name: text} and records per-section token counts in `usage`.
+        """
+        needs = [estimate_tokens(text or '') for _, text, _ in sections]
+        grants = [min(need, int(self.budget * FLOOR_SHARE)) for need in needs]
+        remaining = self.budget - sum(grants)
+        for i, need in enumerate(needs):
+            extra = max(0, min(need - grants[i], remaining))
+            grants[i] += extra
+            remaining -= extra
+
+        fitted = {}
+        for (name, text, keep), grant in zip(sections, grants):
+            fitted[name] = truncate(text or '', grant, keep)
+        self.usage = {
+            'window': self.window,
+            'budget': self.budget,
+            'sections': {name: estimate_tokens(text) for name, text in fitted.items()},
+            'truncated': [name for (name, _, _), need, grant in zip(sections, needs, grants) if grant < need],
+        }
+        self.usage['total'] = self.fixed_tokens + sum(self.usage['sections'].values())
+        return fitted
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import re
+from .cache import DiskCache
+
+# Cache of finished LLM answers. Keys are built from the backend identity
+# (mode, provider, model) and the request fields that decide the answer, with
+# whitespace normalized, so the same failure or query asked again within the
+# TTL is answered without touching the network.
+
+DEFAULT_TTL = 24 * 60 * 60          # SHELLSAGE_CACHE_TTL (seconds)
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def cache_disabled():
+    return bool(os.getenv('SHELLSAGE_NO_CACHE'))
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WHITESPACE.sub(' ', value).strip()
+    return value
+
+
+class ResponseCache:
+    def __init__(self):
+        self.cache = DiskCache(
+            'responses',
+            max_entries=None,
+            max_bytes=DEFAULT_MAX_BYTES,
+            ttl=float(os.getenv('SHELLSAGE_CACHE_TTL', DEFAULT_TTL))
+        )
+
+    @staticmethod
+    def make_key(kind, identity, **fields):
+        """Stable key for a request of `kind` sent to backend `identity`"""
+        payload = json.dumps(
+            {
+                'kind': kind,
+                'backend': list(identity),
+                'fields': {name: _normalize(value) for name, value in fields.items()}
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,244 @@
+import re
+
+# One parser for every model answer: error analyses (Root Cause / Fix / ...),
+# `ask` answers (Analysis / Command / ...) and the formatted solutions built
+# from them, which are cached, stored in the knowledge base and sent by the
+# daemon. It walks the text once, line by line, and can be fed streamed
+# chunks: complete lines are consumed as they arrive, and feed() reports
+# each <think> block and section the moment it closes.
+
+# (name, label, marker) per section, in display order
+ANALYSIS_SECTIONS = [
+    ('cause', 'Root Cause', '🔍'),
+    ('fix', 'Fix', '🛠️'),
+    ('explanation', 'Technical Explanation', '📚'),
+    ('risks', 'Potential Risks', '⚠️'),
+    ('prevention', 'Prevention Tip', '🔒'),
+]
+COMMAND_SECTIONS = [
+    ('analysis', 'Analysis', '🧠'),
+    ('command', 'Command', '🛠️'),
+    ('details', 'Details', '📝'),
+    ('warning', 'Warning', '⚠️'),
+]
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+_BOLD = re.compile(r'\*\*')
+_patterns = {}
+
+
+def _label_pattern(sections):
+    """Regex for a line starting a section: optional bullet, marker, bold or
+    numbering, the label, then a colon (or nothing else on the line)"""
+    key = tuple(label for _, label, _ in sections)
+    if key not in _patterns:
+        labels = '|'.join(re.escape(label) for label in sorted(key, key=len, reverse=True))
+        _patterns[key] = re.compile(
+            r'^[\s>#*-]*'
+            r'(?:[^\w\s`*]{1,3}\s*)?'
+            r'(?:\*\*)?(?:\d+[.)]\s*)?(?:\*\*)?'
+            rf'({labels})'
+            r'(?:\*\*)?[ \t]*(?::|$)(?:\*\*)?[ \t]*(.*)$',
+            re.IGNORECASE
+        )
+    return _patterns[key]
+
+
+class ParsedResponse:
+    """Thoughts and sections of a (possibly partial) model answer"""
+
+    def __init__(self, thoughts, sections, order, preamble, thinking=False, partial_thought=''):
+        self.thoughts = thoughts
+        self.sections = sections
+        self.order = order
+        self.preamble = preamble
+        self.thinking = thinking  # Inside an unclosed <think> block
+        self.partial_thought = partial_thought
+
+    def get(self, name):
+        return self.sections.get(name)
+
+
+class ResponseParser:
+    def __init__(self, sections):
+        self.sections = sections
+        self._pattern = _label_pattern(sections)
+        self._names = {label.lower(): name for name, label, _ in sections}
+        self._pending = ''
+        self._in_think = False
+        self._thought = []
+        self._thoughts = []
+        self._preamble = []
+        self._lines = {}
+        self._order = []
+        self._current = None
+        self._discard = False
+
+    def feed(self, chunk):
+        """Consume the complete lines of `chunk`; returns the blocks they closed
+
+        Events are ('thought', text) and ('section', name, text).
+        """
+        events = []
+        self._pending += chunk
+        if '\n' in chunk:
+            self._pending = self._consume(self._pending, events, final=False)
+        return events
+
+    def finish(self):
+        """Consume the last line and close whatever is open; returns its events"""
+        events = []
+        self._pending = self._consume(self._pending, events, final=True)
+        if self._in_think and ''.join(self._thought).strip():
+            # Output ended mid-thought (length limit): keep what was said
+            self._close_thought(events)
+        self._close_section(events)
+        return events
+
+    def result(self):
+        """Snapshot of everything parsed so far (complete lines only)"""
+        order = [name for name in self._order if self._lines[name]]
+        return ParsedResponse(
+            list(self._thoughts),
+            {name: self._section_text(name) for name in order},
+            order,
+            list(self._preamble),
+            thinking=self._in_think,
+            partial_thought=''.join(self._thought).strip()
+        )
+
+    def _consume(self, text, events, final):
+        """Parse `text` up to its last newline (all of it when final); returns the rest"""
+        pos = 0
+        while True:
+            if self._in_think:
+                # Reasoning is skipped in bulk up to the closing tag, not line by line
+                end = text.find(THINK_CLOSE, pos)
+                if end < 0:
+                    cut = len(text) if final else text.rfind('\n', pos) + 1
+                    if cut > pos:
+                        self._thought.append(text[pos:cut])
+                        pos = cut
+                    return text[pos:]
+                self._thought.append(text[pos:end])
+                self._close_thought(events)
+                pos = end + len(THINK_CLOSE)
+                continue
+            newline = text.find('\n', pos)
+            if newline < 0:
+                if not final:
+                    return text[pos:]
+                newline = len(text)
+            line = text[pos:newline]
+            start = line.find(THINK_OPEN)
+            stray_close = line.find(THINK_CLOSE)
+            if 0 <= stray_close and (start < 0 or stray_close < start):
+                # Some models (deepseek-r1 via Ollama) omit the opening tag:
+                # everything before the close was reasoning
+                self._thought = ['\n'.join(self._preamble), '\n', line[:stray_close]]
+                self._preamble = []
+                self._close_thought(events)
+                pos += stray_close + len(THINK_CLOSE)
+                continue
+            if 0 <= start:
+                if line[:start].strip():
+                    self._text(line[:start], events)
+                self._in_think = True
+                pos += start + len(THINK_OPEN)
+                continue
+            self._text(line, events)
+            if newline >= len(text):
+                return ''
+            pos = newline + 1
+
+    def _text(self, line, events):
+        match = self._pattern.match(line)
+        if match:
+            self._close_section(events)
+            name = self._names[match.group(1).lower()]
+            if self._lines.get(name):
+                self._discard = True  # Repeated section: the first answer wins
+                return
+            if name not in self._lines:
+                self._lines[name] = []
+                self._order.append(name)
+            self._current = name
+            line = match.group(2)
+        stripped = _BOLD.sub('', line).strip()
+        if not stripped or self._discard:
+            return
+        if self._current is not None:
+            self._lines[self._current].append(stripped)
+        else:
+            self._preamble.append(stripped)
+
+    def _close_thought(self, events):
+        thought = ''.join(self._thought).strip()
+        self._thought = []
+        self._in_think = False
+        if thought:
+            self._thoughts.append(thought)
+            events.append(('thought', thought))
+
+    def _close_section(self, events):
+        if self._current is not None and self._lines[self._current]:
+            events.append(('section', self._current, self._section_text(self._current)))
+        self._current = None
+        self._discard = False
+
+    def _section_text(self, name):
+        # Reasoning models tend to repeat lines; keep each once (code fences excepted)
+        seen = set()
+        lines = []
+        for line in self._lines[name]:
+            if line in seen and not line.startswith('```'):
+                continue
+            seen.add(line)
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def parse(text, sections):
+    """Parse a complete answer"""
+    parser = ResponseParser(sections)
+    parser.feed(text or '')
+    parser.finish()
+    return parser.result()
+
+
+def strip_code(text):
+    """Command without the backticks or code fence around it"""
+    text = (text or '').strip()
+    if text.startswith('```'):
+        text = text[3:]
+        newline = text.find('\n')
+        # ```bash\n...```: drop the language tag
+        if 0 <= newline and text[:newline].strip().isalnum():
+            text = text[newline + 1:]
+    return text.strip('`').strip()
+
+
+def format_analysis(parsed, thoughts=True):
+    """Canonical solution text: <think> blocks, then one "marker Label: text" per section
+
+    An unclosed thought (still streaming) ends the text with a bare <think>
+    marker so renderers can show that the model is still reasoning.
+    """
+    markers = {name: f"{marker} {label}:" for name, label, marker in ANALYSIS_SECTIONS}
+    parts = [f"{THINK_OPEN}\n{thought}\n{THINK_CLOSE}" for thought in parsed.thoughts] if thoughts else []
+    parts.extend(parsed.preamble)
+    parts.extend(f"{markers[name]} {parsed.sections[name]}" for name in parsed.order)
+    if parsed.thinking:
+        parts.append(THINK_OPEN)
+    return '\n'.join(parts)
+
+
+def command_results(parsed):
+    """`ask` result items: thinking steps, then analysis/command/details/warning"""
+    results = [{'type': 'thinking', 'content': thought} for thought in parsed.thoughts]
+    results.extend({'type': name, 'content': parsed.get(name)} for name, _, _ in COMMAND_SECTIONS)
+    if parsed.thinking and parsed.partial_thought:
+        results.append({'type': 'thinking', 'content': parsed.partial_thought})
+    return results